@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+# Batch mixing driven by a plan (CSV with the columns: reference, mixed_in,
+# ratio, output). Every input file is parsed once, and its probe matrix is
+# placed in shared memory, from which the worker processes mix without
+# copying or re-parsing. Completed rows are appended to a log, so an
+# interrupted batch resumes where it stopped.
+
+import idattools # log
+from .idat import IDATreader, IDATmixer, SharedIDATdata
+from .shard import get_shard, get_shard_header
+
+from pathlib import Path
+import csv
+import os
+import time
+
+from beartype import beartype
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+
+_worker_inputs = {}
+
+def _mix_worker(i: int, reference: SharedIDATdata, mixed_in: SharedIDATdata, ratio: float, output: str) -> int:
+    # attachments are kept for the lifetime of the worker, inputs are re-used across rows
+    for shared in [reference, mixed_in]:
+        if shared.name not in _worker_inputs:
+            _worker_inputs[shared.name] = shared.attach()
+
+    m = IDATmixer(_worker_inputs[reference.name])
+    m.mix(_worker_inputs[mixed_in.name], ratio, Path(output))
+
+    return i
+
+
+class IDATbatchmixer:
+    @beartype
+    def __init__(self, plan_filename: Path, done_filename: Optional[Path]=None, threads: int=1, shard: Optional[tuple[int, int]]=None):
+        self.plan_filename = plan_filename
+        self.threads = threads
+        self.shard = shard # (i, N): only the i-th of N slices of the plan is run, with its own log
+
+        if done_filename is not None:
+            self.done_filename = done_filename
+        elif shard is not None:
+            self.done_filename = Path(str(plan_filename) + ".shard-" + str(shard[0]) + "-of-" + str(shard[1]) + ".done")
+        else:
+            self.done_filename = Path(str(plan_filename) + ".done")
+
+        self.plan = self.parse_plan()
+
+    @beartype
+    def parse_plan(self) -> list[tuple[str, str, float, str]]:
+        plan = []
+
+        with open(self.plan_filename, "r", newline='') as fh_in:
+            reader = csv.DictReader(fh_in)
+            for _ in ['reference', 'mixed_in', 'ratio', 'output']:
+                if _ not in reader.fieldnames:
+                    raise Exception("Plan lacks column: " + _)
+
+            for row in reader:
+                ratio = float(row['ratio'])
+                if ratio < 0 or ratio > 1:
+                    raise Exception("Invalid mix ratio: " + row['ratio'])
+                plan.append((row['reference'], row['mixed_in'], ratio, row['output']))
+
+        outputs = [_[3] for _ in plan]
+        if len(set(outputs)) != len(outputs):
+            raise Exception("Plan contains duplicate outputs")
+
+        return plan
+
+    @beartype
+    def get_done(self) -> set[str]:
+        if not os.path.exists(self.done_filename):
+            return set()
+
+        with open(self.done_filename, "r") as fh_in:
+            return set(_.rstrip("\n") for _ in fh_in if _.endswith("\n") and not _.startswith("#")) # an incomplete last line is not done
+
+    @beartype
+    def truncate_incomplete_line(self) -> int:
+        """Removes an interrupted write (last line without newline) from the
+        log, so that the next record starts on a new line. Terminating it
+        instead could turn a prefix of an output into a done record.
+        """
+        if not os.path.exists(self.done_filename):
+            return 0
+
+        with open(self.done_filename, "rb+") as fh_log:
+            log = fh_log.read()
+            if len(log) == 0 or log.endswith(b"\n"):
+                return 0
+
+            size = log.rfind(b"\n") + 1
+            fh_log.truncate(size)
+            idattools.log.warning("Removed incomplete last line of: " + str(self.done_filename))
+
+        return len(log) - size
+
+    @beartype
+    def run(self, report_every: int=10) -> int:
+        rows = list(enumerate(self.plan))
+        if self.shard is not None:
+            rows = get_shard(rows, *self.shard)
+            if not os.path.exists(self.done_filename):
+                with open(self.done_filename, "w") as fh_done:
+                    fh_done.write(get_shard_header('mix-batch', *self.shard))
+
+        done = self.get_done()
+        todo = [(i, _) for i, _ in rows if _[3] not in done]
+        idattools.log.info("Plan: " + str(len(rows)) + " rows, " + str(len(rows) - len(todo)) + " already done")
+
+        if len(todo) == 0:
+            return 0
+
+        # every input is parsed once
+        inputs = {}
+        try:
+            for i, (reference, mixed_in, ratio, output) in todo:
+                for idat_filename in [reference, mixed_in]:
+                    if idat_filename not in inputs:
+                        inputs[idat_filename] = IDATreader(Path(idat_filename)).data.to_shared()
+            idattools.log.info("Loaded " + str(len(inputs)) + " unique input files into shared memory")
+
+            n_done = 0
+            failed = []
+            time_start = time.time()
+            self.truncate_incomplete_line()
+            with open(self.done_filename, "a") as fh_done:
+
+                with ProcessPoolExecutor(max_workers=self.threads) as executor:
+                    futures = {executor.submit(_mix_worker, i, inputs[reference], inputs[mixed_in], ratio, output): i for i, (reference, mixed_in, ratio, output) in todo}
+
+                    # a failing row does not stop the others, which are logged as they complete
+                    for future in as_completed(futures):
+                        try:
+                            i = future.result()
+                        except Exception as e:
+                            failed.append(self.plan[futures[future]][3])
+                            idattools.log.error("Failed to mix " + self.plan[futures[future]][3] + ": " + type(e).__name__ + ": " + str(e))
+                            continue
+
+                        fh_done.write(self.plan[i][3] + "\n")
+                        fh_done.flush()
+
+                        n_done += 1
+                        if n_done % report_every == 0 or n_done + len(failed) == len(todo):
+                            elapsed = time.time() - time_start
+                            idattools.log.info("Mixed " + str(n_done) + "/" + str(len(todo)) + " (" + str(round(n_done / elapsed, 2)) + " mixes/s)")
+        finally:
+            for shared in inputs.values():
+                shared.release()
+
+        if len(failed) > 0:
+            raise Exception(str(len(failed)) + " of " + str(len(todo)) + " rows failed (" + ", ".join(failed[:3]) + (", ..." if len(failed) > 3 else "") + "), re-run to retry them")
+
+        return n_done
+
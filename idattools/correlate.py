@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+# Sample x sample correlation of many arrays, to detect sample swaps and
+# duplicate uploads. The log2 intensities of every sample (Grn and Red
+# channel concatenated) are standardized and spilled to a memory-mapped
+# (samples x probes) matrix, of which the correlation matrix is computed in
+# blocks of rows with matrix products (BLAS), so neither all arrays nor the
+# full correlation matrix have to fit in memory.
+
+import idattools # log
+from .idat import IDATreader
+from .utils import pair_red_green
+
+from pathlib import Path
+import os
+import tempfile
+
+from beartype import beartype
+from typing import Optional
+
+import numpy as np
+from numpy import ndarray
+
+
+
+class IDATcorrelator:
+    @beartype
+    def __init__(self, idat_filenames: list[Path], paired: bool=True, tmp_dir: Optional[Path]=None, block_size: int=128):
+        if block_size < 1:
+            raise Exception("Invalid block size")
+
+        if paired:
+            self.samples = {sample: list(pair) for sample, pair in pair_red_green([str(_) for _ in idat_filenames]).items()}
+        else:
+            self.samples = {str(_): [str(_)] for _ in idat_filenames}
+
+        if len(self.samples) < 2:
+            raise Exception("Correlation requires at least two samples")
+
+        self.tmp_dir = tmp_dir
+        self.block_size = block_size
+
+        self.probe_ids = None
+
+    @beartype
+    def read_columns(self, idat_filename: str, columns: list[str]) -> dict[str, ndarray]:
+        """Reads only the sections of the requested columns."""
+        reader = IDATreader(Path(idat_filename), load_per_probe_matrix=False)
+        chunk = next(reader.iter_chunks(reader.data.array_n_probes, columns))
+
+        return {_: chunk[_].to_numpy() for _ in columns}
+
+    @beartype
+    def find_shared_probes(self) -> ndarray:
+        probe_ids = None
+
+        for idat_filenames in self.samples.values():
+            for idat_filename in idat_filenames:
+                ids = self.read_columns(idat_filename, ['probe_ids'])['probe_ids']
+
+                if probe_ids is None:
+                    probe_ids = ids
+                elif not np.array_equal(probe_ids, ids):
+                    probe_ids = np.intersect1d(probe_ids, ids, assume_unique=True)
+
+        if len(probe_ids) == 0:
+            raise Exception("Arrays do not share any probes")
+
+        self.probe_ids = probe_ids
+        return self.probe_ids
+
+    @beartype
+    def spill(self, matrix_filename: str) -> np.memmap:
+        """Writes the standardized log2 intensities of every sample as a row,
+        scaled such that the product of two rows is their correlation.
+        """
+        n_channels = len(next(iter(self.samples.values())))
+        shape = (len(self.samples), n_channels * len(self.probe_ids))
+        matrix = np.memmap(matrix_filename, dtype=np.float32, mode='w+', shape=shape)
+
+        for i, (sample, idat_filenames) in enumerate(self.samples.items()):
+            for j, idat_filename in enumerate(idat_filenames):
+                columns = self.read_columns(idat_filename, ['probe_ids', 'probe_mean_intensities'])
+
+                # probe_ids are strictly incremental, so the intersect can be located by binary search
+                idx = np.searchsorted(columns['probe_ids'], self.probe_ids)
+                matrix[i, j * len(self.probe_ids):(j + 1) * len(self.probe_ids)] = np.log2(columns['probe_mean_intensities'][idx] + 1.0)
+
+            row = matrix[i]
+            row -= row.mean()
+            norm = np.linalg.norm(row)
+            if norm == 0:
+                idattools.log.warning("Constant intensities, sample is not correlated: " + sample)
+            else:
+                row /= norm
+
+        matrix.flush()
+        return matrix
+
+    @beartype
+    def iter_blocks(self, matrix: ndarray):
+        """Yields (row_from, col_from, block) of the upper triangle of the correlation matrix."""
+        n = matrix.shape[0]
+
+        for row_from in range(0, n, self.block_size):
+            rows = np.asarray(matrix[row_from:row_from + self.block_size])
+
+            for col_from in range(row_from, n, self.block_size):
+                cols = rows if col_from == row_from else np.asarray(matrix[col_from:col_from + self.block_size])
+
+                yield row_from, col_from, rows @ cols.T
+
+    @beartype
+    def get_top_pairs(self, threshold: float=0.99, top: Optional[int]=None) -> list[tuple[str, str, float]]:
+        """Pairs of samples with a correlation of at least threshold, highest first."""
+        self.find_shared_probes()
+        samples = list(self.samples.keys())
+
+        pairs = []
+        with tempfile.TemporaryDirectory(dir=self.tmp_dir) as tmp_dir:
+            matrix = self.spill(os.path.join(tmp_dir, "intensities.f4"))
+
+            for row_from, col_from, block in self.iter_blocks(matrix):
+                if row_from == col_from:
+                    block[np.tril_indices(len(block))] = -np.inf # diagonal and lower triangle are redundant
+
+                for i, j in zip(*np.nonzero(block >= threshold)):
+                    pairs.append((samples[row_from + i], samples[col_from + j], float(block[i, j])))
+
+            del matrix
+
+        pairs.sort(key=lambda _: _[2], reverse=True)
+
+        return pairs if top is None else pairs[:top]
+
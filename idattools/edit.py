@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+
+# In-place edits of probe values. The probe sections have a fixed size and
+# their offsets are in the section index, so they are memory-mapped
+# writable and edited with vectorized operations, without parsing or
+# rewriting any other section. Edits are applied to the file itself or to a
+# copy (a reflink where the file system supports it).
+
+import idattools # log
+from .idat import section_names, probe_sections, default_chunk_probes
+from .utils import *
+
+from pathlib import Path
+import fcntl
+import os
+import shutil
+
+from beartype import beartype
+from typing import Optional
+
+import numpy as np
+from numpy import ndarray
+
+
+
+FICLONE = 0x40049409 # linux/fs.h, reflink of an entire file (btrfs, xfs, ...)
+
+editable_columns = ['probe_std_devs', 'probe_mean_intensities', 'probe_n_beads']
+
+
+@beartype
+def reflink_or_copy(src_filename: Path, dst_filename: Path) -> Path:
+    """Copy that shares the blocks with the source if possible (copy-on-write)."""
+    if os.path.exists(dst_filename) and os.path.samefile(src_filename, dst_filename):
+        raise Exception("Source and destination are the same file (edit in place instead): " + str(dst_filename)) # opening dst would truncate src
+
+    with open(src_filename, "rb") as fh_in, open(dst_filename, "wb") as fh_out:
+        try:
+            fcntl.ioctl(fh_out.fileno(), FICLONE, fh_in.fileno())
+            return dst_filename
+        except OSError:
+            idattools.log.debug("Reflink not supported, copying: " + str(dst_filename))
+
+    shutil.copyfile(src_filename, dst_filename) # copy_file_range / sendfile where available
+    return dst_filename
+
+
+class IDATeditor:
+    @beartype
+    def __init__(self, idat_filename: Path, output_filename: Optional[Path]=None):
+        """Edits idat_filename in place, or a copy of it (output_filename)."""
+        if idat_filename.suffix == ".gz":
+            raise Exception("Compressed files can not be edited in place: " + str(idat_filename))
+
+        if output_filename is not None:
+            idat_filename = reflink_or_copy(idat_filename, output_filename)
+        self.idat_filename = idat_filename
+
+        self.columns = {}
+        self.parse()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @beartype
+    def parse(self) -> int:
+        """Reads the section index and maps the probe sections."""
+        file_size = os.path.getsize(self.idat_filename)
+
+        with open(self.idat_filename, "rb") as fh_in:
+            if fh_in.read(4) != b"IDAT":
+                raise Exception("Invalid file format: " + str(self.idat_filename))
+            read_long(fh_in) # version
+
+            section_offsets = {}
+            for i in range(read_int(fh_in)):
+                section_type_int = read_short(fh_in)
+                section_offset = read_long(fh_in)
+                if section_type_int in section_names:
+                    section_offsets[section_names[section_type_int]] = section_offset
+
+            for section in [probe_sections[_][0] for _ in editable_columns + ['probe_ids']] + ['ARRAY_N_PROBES']:
+                if section not in section_offsets:
+                    raise Exception("Missing section " + section + ": " + str(self.idat_filename))
+
+            fh_in.seek(section_offsets['ARRAY_N_PROBES'])
+            n_probes = read_int(fh_in)
+
+        for column, (section, dtype, vector_offset) in probe_sections.items():
+            if column not in editable_columns + ['probe_ids']:
+                continue
+
+            offset = section_offsets[section] + vector_offset
+            if offset + (n_probes * np.dtype(dtype).itemsize) > file_size:
+                raise Exception("Truncated file, section " + section + " exceeds the file size: " + str(self.idat_filename))
+
+            self.columns[column] = np.memmap(self.idat_filename, dtype=np.dtype(dtype), mode='r' if column == 'probe_ids' else 'r+', offset=offset, shape=(n_probes,))
+
+        self.n_probes = n_probes
+        return n_probes
+
+    @beartype
+    def locate(self, probe_ids: ndarray) -> ndarray:
+        """Positions of the probe ids; probes that are not on the array are skipped."""
+        ids = self.columns['probe_ids']
+        idx = np.searchsorted(ids, probe_ids)
+        idx[idx >= len(ids)] = 0
+        found = ids[idx] == probe_ids
+
+        if not np.all(found):
+            idattools.log.warning(str(np.count_nonzero(~found)) + " probe ids are not present on the array: " + str(self.idat_filename))
+
+        return idx[found]
+
+    @beartype
+    def get_columns(self, columns: Optional[list[str]]) -> list[str]:
+        if columns is None:
+            return editable_columns
+
+        for column in columns:
+            if column not in editable_columns:
+                raise Exception("Column can not be edited: " + column)
+
+        return columns
+
+    @beartype
+    def scale(self, factor: float, columns: Optional[list[str]]=None, chunk_probes: int=default_chunk_probes) -> int:
+        """Multiplies the values (default: intensities and std devs) by factor,
+        rounded and clipped to the range of the type, chunk by chunk.
+        """
+        if factor < 0:
+            raise Exception("Invalid scaling factor: " + str(factor))
+
+        for column in self.get_columns(columns if columns is not None else ['probe_mean_intensities', 'probe_std_devs']):
+            values = self.columns[column]
+            maximum = np.iinfo(values.dtype).max
+            for start in range(0, self.n_probes, chunk_probes):
+                chunk = values[start:start + chunk_probes]
+                chunk[:] = np.clip(np.round(chunk * factor), 0, maximum).astype(values.dtype)
+
+        return self.n_probes
+
+    @beartype
+    def mask(self, probe_ids: ndarray, columns: Optional[list[str]]=None, value: int=0) -> int:
+        """Sets the values of the given probes (default: intensity, std dev and bead count to 0)."""
+        idx = self.locate(probe_ids)
+
+        for column in self.get_columns(columns):
+            self.columns[column][idx] = value
+
+        return len(idx)
+
+    @beartype
+    def mask_low_beads(self, min_beads: int, columns: Optional[list[str]]=None, value: int=0) -> int:
+        """Masks the probes with fewer than min_beads beads."""
+        idx = np.flatnonzero(self.columns['probe_n_beads'] < min_beads)
+
+        for column in self.get_columns(columns):
+            self.columns[column][idx] = value
+
+        return len(idx)
+
+    def close(self):
+        for values in self.columns.values():
+            if values.mode == 'r+':
+                values.flush()
+        self.columns = {}
+
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+# Content fingerprints of the probe sections, to find files with identical
+# probe data that differ elsewhere (e.g. ARRAY_RUN_INFO or the sample id of
+# a re-upload). Only the section index is parsed; the raw bytes of the
+# PROBE_* sections are hashed (BLAKE2b) without decoding them. Fingerprints
+# can be cached in a TSV file, keyed by file size and modification time.
+
+import idattools # log
+from .idat import section_names, probe_sections
+from .utils import *
+
+from pathlib import Path
+import collections
+import gzip
+import hashlib
+import os
+
+from beartype import beartype
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+
+fingerprint_sections = [_[0] for _ in probe_sections.values()]
+
+
+@beartype
+def get_section_fingerprints(idat_filename: Path, block_size: int=1024 * 1024) -> dict[str, str]:
+    """{section: hex digest} of the raw bytes of every PROBE_* section."""
+    fh_in = gzip.open(idat_filename, "rb") if idat_filename.suffix == ".gz" else open(idat_filename, "rb")
+
+    with fh_in:
+        if fh_in.read(4) != b"IDAT":
+            raise Exception("Invalid file format: " + str(idat_filename))
+        read_long(fh_in) # version
+
+        section_offsets = {}
+        for i in range(read_int(fh_in)):
+            section_type_int = read_short(fh_in)
+            section_offset = read_long(fh_in)
+            if section_type_int in section_names:
+                section_offsets[section_names[section_type_int]] = section_offset
+
+        for _ in fingerprint_sections + ['ARRAY_N_PROBES']:
+            if _ not in section_offsets:
+                raise Exception("Missing section " + _ + ": " + str(idat_filename))
+
+        fh_in.seek(section_offsets['ARRAY_N_PROBES'])
+        n_probes = read_int(fh_in)
+
+        buffer = bytearray(block_size)
+        fingerprints = {}
+        for section, dtype, vector_offset in probe_sections.values():
+            size = vector_offset + (n_probes * np.dtype(dtype).itemsize)
+            digest = hashlib.blake2b(digest_size=16)
+
+            fh_in.seek(section_offsets[section])
+            while size > 0:
+                view = memoryview(buffer)[:min(size, block_size)]
+                n = fh_in.readinto(view)
+                if n == 0:
+                    raise EOFError("Truncated section " + section + ": " + str(idat_filename))
+                digest.update(view[:n])
+                size -= n
+
+            fingerprints[section] = digest.hexdigest()
+
+    return fingerprints
+
+
+@beartype
+def get_probe_fingerprint(section_fingerprints: dict[str, str]) -> str:
+    """Single fingerprint of all probe data, from the section fingerprints."""
+    return hashlib.blake2b("".join(section_fingerprints[_] for _ in fingerprint_sections).encode(), digest_size=16).hexdigest()
+
+
+class IDATdedup:
+    """Groups files with identical probe data. The work is IO bound, hence
+    threads (hashlib releases the GIL) rather than processes.
+    """
+
+    @beartype
+    def __init__(self, idat_filenames: list[Path], threads: int=16, cache_filename: Optional[Path]=None):
+        self.idat_filenames = idat_filenames
+        self.threads = threads
+        self.cache_filename = cache_filename
+
+        self.fingerprints = {} # {file: {section: fingerprint}}
+
+    @beartype
+    def load_cache(self) -> dict:
+        """{file: ((size, mtime_ns), {section: fingerprint})}"""
+        cache = {}
+
+        if self.cache_filename is not None and os.path.exists(self.cache_filename):
+            with open(self.cache_filename, "r") as fh_in:
+                header = fh_in.readline().rstrip("\n").split("\t")
+                if header != ['file', 'size', 'mtime_ns'] + fingerprint_sections:
+                    raise Exception("Invalid fingerprint cache: " + str(self.cache_filename))
+
+                for line in fh_in:
+                    fields = line.rstrip("\n").split("\t")
+                    cache[fields[0]] = ((int(fields[1]), int(fields[2])), dict(zip(fingerprint_sections, fields[3:])))
+
+        return cache
+
+    @beartype
+    def write_cache(self, cache: dict) -> Path:
+        tmp_filename = str(self.cache_filename) + ".tmp"
+        with open(tmp_filename, "w") as fh_out:
+            fh_out.write("\t".join(['file', 'size', 'mtime_ns'] + fingerprint_sections) + "\n")
+            for idat_filename, ((size, mtime_ns), fingerprints) in cache.items():
+                fh_out.write("\t".join([idat_filename, str(size), str(mtime_ns)] + [fingerprints[_] for _ in fingerprint_sections]) + "\n")
+        os.replace(tmp_filename, self.cache_filename) # atomic, concurrent jobs may share the cache
+
+        return self.cache_filename
+
+    @beartype
+    def get_fingerprints(self) -> dict:
+        cache = self.load_cache()
+
+        keys = {}
+        todo = []
+        for idat_filename in self.idat_filenames:
+            stat = os.stat(idat_filename)
+            keys[idat_filename] = (stat.st_size, stat.st_mtime_ns)
+
+            if str(idat_filename) in cache and cache[str(idat_filename)][0] == keys[idat_filename]:
+                self.fingerprints[idat_filename] = cache[str(idat_filename)][1]
+            else:
+                todo.append(idat_filename)
+
+        idattools.log.info("Fingerprinting " + str(len(todo)) + " files (" + str(len(self.idat_filenames) - len(todo)) + " cached)")
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            futures = [executor.submit(get_section_fingerprints, _) for _ in todo]
+            for idat_filename, future in zip(todo, futures):
+                try:
+                    self.fingerprints[idat_filename] = future.result()
+                except Exception as e: # one corrupt file should not stop an archive-wide scan
+                    idattools.log.warning("Skipping " + str(idat_filename) + ": " + type(e).__name__ + ": " + str(e))
+
+        todo = [_ for _ in todo if _ in self.fingerprints]
+
+        if self.cache_filename is not None and len(todo) > 0:
+            # entries of other files are kept, the cache may be shared by several directories
+            cache.update({str(_): (keys[_], self.fingerprints[_]) for _ in todo})
+            self.write_cache(cache)
+
+        return self.fingerprints
+
+    @beartype
+    def get_duplicates(self) -> dict[str, list[Path]]:
+        """{probe fingerprint: files} of the groups with more than one file."""
+        groups = collections.defaultdict(list)
+
+        for idat_filename, fingerprints in self.get_fingerprints().items():
+            groups[get_probe_fingerprint(fingerprints)].append(idat_filename)
+
+        return {fingerprint: files for fingerprint, files in groups.items() if len(files) > 1}
+
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+
+# Cheap integrity checks of IDAT files: only the header, the section index and
+# the (small) string sections are read. The offsets from the index and the
+# expected section sizes (see IDATwriter.get_section_sizes) must tile the
+# file exactly, which catches truncated and corrupted downloads before they
+# surface deep inside a batch job.
+
+from .idat import section_names, probe_sections
+from .utils import *
+
+from pathlib import Path
+import gzip
+import os
+
+from beartype import beartype
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+
+string_sections = ['ARRAY_MANIFEST', 'ARRAY_BARCODE', 'ARRAY_CHIP_TYPE', 'ARRAY_CHIP_LABEL', 'ARRAY_OLD_STYLE_MANIFEST', 'ARRAY_SAMPLE_ID', 'ARRAY_DESCRIPTION', 'ARRAY_PLATE', 'ARRAY_WELL', 'ARRAY_UNKNOWN_2']
+fixed_size_sections = {'ARRAY_N_PROBES': 4, 'ARRAY_RED_GREEN': 4, 'ARRAY_UNKNOWN_1': 4}
+
+
+@beartype
+def skip_string(fh_in: IOBase) -> int:
+    """Skips a string like read_string reads it, but fails on short reads
+    (read_string returns what is there, so a truncated string would pass).
+    """
+    num_chars = 0
+    shift = 0
+
+    while True:
+        num_bytes = fh_in.read(1)
+        if len(num_bytes) != 1:
+            raise EOFError("End of file in string length")
+
+        num_chars += (num_bytes[0] % 128) * (2 ** shift)
+        shift += 7
+        if num_bytes[0] // 128 != 1:
+            break
+
+    if len(fh_in.read(num_chars)) != num_chars:
+        raise EOFError("End of file in string of " + str(num_chars) + " bytes")
+
+    return num_chars
+
+
+@beartype
+def get_section_size(fh_in: IOBase, section: str, offset: int, n_probes: int, file_size: int) -> int:
+    if section in fixed_size_sections:
+        return fixed_size_sections[section]
+
+    for column, (probe_section, dtype, vector_offset) in probe_sections.items():
+        if section == probe_section:
+            return vector_offset + (n_probes * np.dtype(dtype).itemsize)
+
+    fh_in.seek(offset)
+    try:
+        if section in string_sections:
+            skip_string(fh_in)
+        elif section == 'ARRAY_RUN_INFO':
+            n_run_info = fh_in.read(4)
+            if len(n_run_info) != 4:
+                raise EOFError("End of file in number of run info entries")
+            n_run_info = bytes_to_int(n_run_info)
+            if 4 + (n_run_info * 5) > file_size - offset:
+                raise Exception("Invalid number of run info entries: " + str(n_run_info))
+
+            for i in range(n_run_info * 5):
+                skip_string(fh_in)
+        else:
+            raise Exception("Not implemented section: " + section)
+    except EOFError as e:
+        raise EOFError("Truncated file, section " + section + ": " + str(e))
+
+    size = fh_in.tell() - offset
+    if offset + size > file_size:
+        raise EOFError("Truncated file, section " + section + " ends beyond the end of the file (" + str(file_size) + " bytes)")
+
+    return size
+
+
+@beartype
+def check_idat(idat_filename: Path, deep: bool=False) -> list[str]:
+    """Returns the problems found in the file (empty list if it is fine)."""
+    problems = []
+
+    try:
+        if idat_filename.suffix == ".gz":
+            fh_in = gzip.open(idat_filename, "rb")
+            file_size = fh_in.seek(0, os.SEEK_END) # requires decompression
+        else:
+            fh_in = open(idat_filename, "rb")
+            file_size = os.fstat(fh_in.fileno()).st_size
+
+        with fh_in:
+            fh_in.seek(0)
+            if file_size < 16:
+                return ["File too small: " + str(file_size) + " bytes"]
+
+            if fh_in.read(4) != b"IDAT":
+                return ["Invalid file magic"]
+
+            idat_version = read_long(fh_in)
+            if idat_version != 3:
+                problems.append("Untested idat version: " + str(idat_version))
+
+            n_sections = read_int(fh_in)
+            index_end = 16 + (n_sections * (2 + 8))
+            if index_end > file_size:
+                return problems + ["Section index (" + str(n_sections) + " sections) exceeds file size"]
+
+            section_offsets = {}
+            sections_beyond_eof = []
+            for i in range(n_sections):
+                section_type_int = read_short(fh_in)
+                section_offset = read_long(fh_in)
+
+                if section_type_int not in section_names:
+                    problems.append("Unimplemented section type: " + str(section_type_int))
+                elif section_names[section_type_int] in section_offsets:
+                    problems.append("Duplicate section: " + section_names[section_type_int])
+                elif section_offset >= file_size:
+                    sections_beyond_eof.append(section_names[section_type_int])
+                elif section_offset < index_end:
+                    problems.append("Offset of " + section_names[section_type_int] + " out of range: " + str(section_offset))
+                else:
+                    section_offsets[section_names[section_type_int]] = section_offset
+
+            if len(sections_beyond_eof) > 0:
+                problems.append("Truncated file: " + str(len(sections_beyond_eof)) + " section(s) start beyond the end of the file (" + str(file_size) + " bytes)")
+
+            missing = [_ for _ in section_names.values() if _ not in section_offsets and _ not in sections_beyond_eof]
+            if len(missing) > 0:
+                problems.append("Missing sections: " + ", ".join(missing))
+            if len(problems) > 0:
+                return problems
+
+            fh_in.seek(section_offsets['ARRAY_N_PROBES'])
+            n_probes = read_int(fh_in)
+            if n_probes <= 0:
+                return ["Invalid number of probes: " + str(n_probes)]
+
+            # sections must tile the body of the file without gaps or overlaps
+            expected_offset = index_end
+            for section in sorted(section_offsets, key=lambda _: section_offsets[_]):
+                if section_offsets[section] != expected_offset:
+                    problems.append(("Gap" if section_offsets[section] > expected_offset else "Overlap") + " before section " + section + ": expected offset " + str(expected_offset) + ", found " + str(section_offsets[section]))
+                    break
+
+                expected_offset += get_section_size(fh_in, section, section_offsets[section], n_probes, file_size)
+
+            if len(problems) == 0 and expected_offset != file_size:
+                problems.append(("Truncated file: " + str(file_size) + " bytes, expected " if expected_offset > file_size else "Trailing data: " + str(file_size) + " bytes, expected ") + str(expected_offset))
+
+            fh_in.seek(section_offsets['PROBE_MID_BLOCK'])
+            if len(problems) == 0 and read_int(fh_in) != n_probes:
+                problems.append("Discrepancy between number of probes and size of mid block")
+
+            if deep and len(problems) == 0:
+                fh_in.seek(section_offsets['PROBE_IDS'])
+                probe_ids = read_numpy_vector(fh_in, np.dtype('<u4'), n_probes)
+                fh_in.seek(section_offsets['PROBE_MID_BLOCK'] + 4)
+                probe_mid_block = read_numpy_vector(fh_in, np.dtype('<u4'), n_probes)
+
+                if np.any(probe_ids <= 0):
+                    problems.append("Wrong probe id's found")
+                if np.any(probe_ids[1:] <= probe_ids[:-1]):
+                    problems.append("probe id's are not unique or not incremental")
+                if not np.array_equal(probe_ids, probe_mid_block):
+                    problems.append("Discrepance between probe_ids and probe_mid_block")
+
+    except Exception as e:
+        problems.append(type(e).__name__ + ": " + str(e))
+
+    return problems
+
+
+class IDATfsck:
+    @beartype
+    def __init__(self, idat_filenames: list[Path], deep: bool=False, threads: int=16):
+        self.idat_filenames = idat_filenames
+        self.deep = deep
+        self.threads = threads
+
+    def __iter__(self):
+        """Yields (filename, problems) in the order of the files. The checks
+        are IO-latency bound, hence threads rather than processes.
+        """
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            yield from zip(self.idat_filenames, executor.map(check_idat, self.idat_filenames, [self.deep] * len(self.idat_filenames)))
+
@@ -12,9 +12,17 @@ import os
 import re
 import random
 import warnings
+import contextlib
+import copy
+import gzip
+import pickle
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from multiprocessing import shared_memory, resource_tracker
 
 from beartype import beartype
-from _io import BufferedReader, BufferedWriter
+from typing import Optional, Union
+from io import IOBase, BytesIO
 
 import numpy as np
 from numpy import ndarray
@@ -46,6 +54,16 @@ section_names = {
     1000: 'ARRAY_N_PROBES'
 }
 
+probe_sections = { # column in per_probe_matrix: (section, dtype, offset of the vector within the section)
+    'probe_ids': ('PROBE_IDS', '<u4', 0),
+    'probe_std_devs': ('PROBE_STD_DEVS', '<u2', 0),
+    'probe_mean_intensities': ('PROBE_MEAN_INTENSITIES', '<u2', 0),
+    'probe_n_beads': ('PROBE_N_BEADS', '<u1', 0),
+    'probe_mid_block': ('PROBE_MID_BLOCK', '<u4', 4) # preceded by the number of probes
+}
+
+default_chunk_probes = 65536
+
 
 
 class IDATdata(object):
@@ -57,6 +75,11 @@ class IDATdata(object):
         self.section_physical_order = None        
         self.array_n_probes = None
         self.per_probe_matrix = None
+        self.chunk_source = None # callable(chunk_probes, columns) yielding chunks, if per_probe_matrix is not in memory
+        self.source = None # raw IDAT file the data was read from
+        self.source_sections = {} # unmodified sections in source: {section: (offset, size)}, copied as-is by IDATwriter
+        self.source_values = {} # {section: value} as read from source, to detect changes that bypassed the setters
+        self.shared_memory = None # block viewed by per_probe_matrix (see SharedIDATdata), kept alive by this object
         self.array_red_green = None
         self.array_manifest = None
         self.array_barcode = None
@@ -73,11 +96,47 @@ class IDATdata(object):
 
 
     def __str__(self):
+        return self.get_summary(self.get_total_intensity()) + str(self.per_probe_matrix)
+
+
+    def __reduce_ex__(self, protocol):
+        """Pickles the probe columns as raw arrays instead of a DataFrame. With
+        protocol 5 they are PickleBuffers, which are transferred out-of-band
+        (without copies) if the pickler is given a buffer_callback. Columns
+        of read-only out-of-band buffers (e.g. bytes) are copied when
+        unpickled, so the per probe matrix can always be edited.
+        """
+        state = {k: v for k, v in self.__dict__.items() if k not in ['per_probe_matrix', 'shared_memory']}
+        state['source_values'] = self.get_metadata_source_values() # the probe columns are pickled once, below
+
+        columns = None
+        if self.per_probe_matrix is not None:
+            columns = []
+            for column in self.per_probe_matrix.columns:
+                array = np.ascontiguousarray(self.per_probe_matrix[column].to_numpy())
+                if not array.flags.writeable: # copy-on-write views; in-band, writable buffers are restored as bytearray
+                    array = array.view()
+                    array.flags.writeable = True
+                columns.append((column, array.dtype.str, pickle.PickleBuffer(array) if protocol >= 5 else array))
+            columns = (self.per_probe_matrix.index, columns)
+
+        return (_restore_idat_data, (state, columns))
+
+
+    def get_total_intensity(self) -> int:
+        return int(self.per_probe_matrix['probe_mean_intensities'].to_numpy().sum(dtype=np.uint64))
+
+
+    def get_summary(self, total_intensity: Optional[int]=None) -> str:
+        """Header of __str__, without the per probe matrix. The total
+        intensity is only printed when given, so it can be skipped or be
+        computed without materializing the per probe matrix.
+        """
         out = ""
 
         out += "# array_n_probes:       " + str(self.array_n_probes) + "\n"
-        out += "# total intensity:      " + str(sum(self.per_probe_matrix['probe_mean_intensities'])) + "\n"
-        out += "# array_n_probes:       " + str(self.array_n_probes) + "\n"
+        if total_intensity is not None:
+            out += "# total intensity:      " + str(total_intensity) + "\n"
         out += "# manifest:             '" + str(self.array_manifest) + "'\n"
         out += "# manifest (old style): '" + str(self.array_old_style_manifest) + "'\n"
         out += "# unknown #1:           [" + "][".join([str(_) for _ in self.array_unknown_1]) + "]\n"
@@ -102,11 +161,42 @@ class IDATdata(object):
         out += self.array_chip_type
         out += ")"
         out += "\n"
-        out += str(self.per_probe_matrix)
 
         return out
 
 
+    @beartype
+    def set_source(self, source: Path, source_sections: dict) -> dict:
+        self.source = source
+        self.source_sections = source_sections
+        self.source_values = {**self.get_metadata_source_values(snapshot=True), **self.get_probe_source_values()}
+
+        return self.source_sections
+
+    def set_modified(self, *sections):
+        """Sections that are changed can no longer be copied from the source.
+        Setters call this; in-place edits (e.g. per_probe_matrix.loc[...]) are
+        caught by IDATwriter comparing with source_values.
+        """
+        if len(self.source_sections) > 0:
+            # a new dict, as copies of this object (copy.copy) may share it
+            self.source_sections = {k: v for k, v in self.source_sections.items() if k not in sections}
+
+    def get_metadata_source_values(self, snapshot: bool=False) -> dict:
+        """The non-probe sections of source_values, or (snapshot=True) copies of their current values."""
+        sections = [_ for _ in section_names.values() if _ not in [__[0] for __ in probe_sections.values()]]
+        if snapshot:
+            return {_: copy.deepcopy(getattr(self, _.lower())) for _ in sections}
+
+        return {k: v for k, v in self.source_values.items() if k in sections}
+
+    def get_probe_source_values(self) -> dict:
+        """The probe columns as Series; copy-on-write keeps them unchanged when the matrix is edited in place."""
+        if self.per_probe_matrix is None:
+            return {}
+
+        return {section: self.per_probe_matrix[column] for column, (section, _, _) in probe_sections.items()}
+
     @beartype
     def set_file_magic(self, file_magic: str) -> str:
         if file_magic != "IDAT":
@@ -132,6 +222,7 @@ class IDATdata(object):
         if array_n_probes <= 0:
             raise Exception("Invalid number of probes: " + str(array_n_probes))
         else:
+            self.set_modified('ARRAY_N_PROBES')
             self.array_n_probes = array_n_probes
         
         return self.array_n_probes
@@ -180,6 +271,9 @@ class IDATdata(object):
         if per_probe_matrix['probe_mid_block'].dtype != dtype("uint32"):
             raise Exception("Wrong format for probe_mid_block")
 
+        for column, (section, _, _) in probe_sections.items():
+            if self.per_probe_matrix is None or not np.array_equal(self.per_probe_matrix[column].to_numpy(), per_probe_matrix[column].to_numpy()):
+                self.set_modified(section)
 
         self.per_probe_matrix = per_probe_matrix
         return self.per_probe_matrix
@@ -189,6 +283,7 @@ class IDATdata(object):
     def set_array_red_green(self, array_red_green: int) -> int:
         # checks here
         
+        self.set_modified('ARRAY_RED_GREEN')
         self.array_red_green = array_red_green
         return self.array_red_green
 
@@ -197,6 +292,7 @@ class IDATdata(object):
     def set_array_manifest(self, array_manifest: str) -> str:
         # checks here
         
+        self.set_modified('ARRAY_MANIFEST')
         self.array_manifest = array_manifest
         return self.array_manifest
 
@@ -206,6 +302,7 @@ class IDATdata(object):
         if not re.match(r"^[0-9]+$", array_barcode):
             raise Exception("Incorrect barcode: " + array_barcode)
         
+        self.set_modified('ARRAY_BARCODE')
         self.array_barcode = array_barcode
         return self.array_barcode
 
@@ -215,6 +312,7 @@ class IDATdata(object):
         if array_chip_type not in ["BeadChip 8x5", "BeadChip 12x8"]:
             raise Exception("[%s] This tool is not tested with other chip types than BeadChip 8x5", array_chip_type)
         
+        self.set_modified('ARRAY_CHIP_TYPE')
         self.array_chip_type = array_chip_type
         return self.array_chip_type
 
@@ -226,6 +324,7 @@ class IDATdata(object):
         elif not re.match(r"^R[0-9]+C[0-9]+$", array_chip_label):
             raise Exception(f"Odd label: {array_chip_label}")
         
+        self.set_modified('ARRAY_CHIP_LABEL')
         self.array_chip_label = array_chip_label
         return self.array_chip_label
 
@@ -234,6 +333,7 @@ class IDATdata(object):
     def set_array_old_style_manifest(self, array_old_style_manifest: str) -> str:
         # checks here
         
+        self.set_modified('ARRAY_OLD_STYLE_MANIFEST')
         self.array_old_style_manifest = array_old_style_manifest
         return self.array_old_style_manifest
 
@@ -242,6 +342,7 @@ class IDATdata(object):
     def set_array_unknown_1(self, array_unknown_1: tuple[int, int, int, int]) -> tuple[int, int, int, int]:
         # checks here
         
+        self.set_modified('ARRAY_UNKNOWN_1')
         self.array_unknown_1 = array_unknown_1
         return self.array_unknown_1
 
@@ -250,6 +351,7 @@ class IDATdata(object):
     def set_array_sample_id(self, array_sample_id: str) -> str:
         # checks here
         
+        self.set_modified('ARRAY_SAMPLE_ID')
         self.array_sample_id = array_sample_id
         return self.array_sample_id
 
@@ -258,6 +360,7 @@ class IDATdata(object):
     def set_array_description(self, array_description: str) -> str:
         # checks here
         
+        self.set_modified('ARRAY_DESCRIPTION')
         self.array_description = array_description
         return self.array_description
 
@@ -266,6 +369,7 @@ class IDATdata(object):
     def set_array_plate(self, array_plate: str) -> str:
         # checks here
         
+        self.set_modified('ARRAY_PLATE')
         self.array_plate = array_plate
         return self.array_plate
 
@@ -274,6 +378,7 @@ class IDATdata(object):
     def set_array_well(self, array_well: str) -> str:
         # checks here
         
+        self.set_modified('ARRAY_WELL')
         self.array_well = array_well
         return self.array_well
 
@@ -282,6 +387,7 @@ class IDATdata(object):
     def set_array_unknown_2(self, array_unknown_2: str) -> str:
         # checks here
         
+        self.set_modified('ARRAY_UNKNOWN_2')
         self.array_unknown_2 = array_unknown_2
         return self.array_unknown_2
 
@@ -290,37 +396,216 @@ class IDATdata(object):
     def set_array_run_info(self, array_run_info: list[tuple[str, str, str, str, str]]) -> list[tuple[str, str, str, str, str]]:
         # checks here
         
+        self.set_modified('ARRAY_RUN_INFO')
         self.array_run_info = array_run_info
         return self.array_run_info
 
     def get_sentrix_id(self):
         return self.array_barcode + "_" + self.array_chip_label
 
+    def iter_chunks(self, chunk_probes: Optional[int]=None, columns: Optional[list[str]]=None):
+        """Yields the per probe matrix in chunks of at most chunk_probes rows,
+        either as slices of the in-memory matrix or read from the source.
+        With chunk_probes=None an in-memory matrix is yielded at once.
+        """
+        if self.per_probe_matrix is not None:
+            per_probe_matrix = self.per_probe_matrix if columns is None else self.per_probe_matrix[columns]
+
+            if chunk_probes is None:
+                yield per_probe_matrix
+            else:
+                for start in range(0, len(per_probe_matrix), chunk_probes):
+                    yield per_probe_matrix.iloc[start:start + chunk_probes]
+        elif self.chunk_source is not None:
+            yield from self.chunk_source(chunk_probes if chunk_probes is not None else default_chunk_probes, columns)
+        else:
+            raise Exception("No per probe matrix available")
+
+    def get_per_probe_matrix(self) -> DataFrame:
+        """Returns the per probe matrix, loading it into memory if it is chunked."""
+        if self.per_probe_matrix is None:
+            source_sections = self.source_sections # loaded as-is from the source
+            self.set_per_probe_matrix(pd.concat(list(self.iter_chunks())))
+            self.source_sections = source_sections
+            self.source_values = {**self.source_values, **self.get_probe_source_values()}
+            self.chunk_source = None
+
+        return self.per_probe_matrix
+
+    def to_shared(self):
+        """Copies the per probe matrix into shared memory, see SharedIDATdata."""
+        return SharedIDATdata(self)
+
+
+def _restore_idat_data(state: dict, columns: Optional[tuple]) -> IDATdata:
+    idat_data = IDATdata.__new__(IDATdata)
+    idat_data.__dict__.update(state)
+    idat_data.shared_memory = None
+    idat_data.per_probe_matrix = None
+
+    if columns is not None:
+        index, columns = columns
+        vectors = {}
+        for column, dtype, buffer in columns:
+            # a view of the (in-band or out-of-band) buffer, unless that is read-only
+            vectors[column] = np.frombuffer(buffer, dtype=np.dtype(dtype))
+            if not vectors[column].flags.writeable:
+                vectors[column] = vectors[column].copy()
+        idat_data.per_probe_matrix = pd.DataFrame(vectors, index=index, copy=False)
+
+    return idat_data
+
+
+
+def open_shared_memory(name: Optional[str]=None, size: int=0) -> shared_memory.SharedMemory:
+    """Creates (name=None) or attaches a block that is not tracked: it is
+    handed between processes, so the lifetime is managed explicitly.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, create=name is None, size=size, track=False)
+
+    shm = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+    resource_tracker.unregister(shm._name, "shared_memory") # track=False before python 3.13
+    return shm
+
+
+def unlink_shared_memory(shm: shared_memory.SharedMemory) -> None:
+    if sys.version_info < (3, 13):
+        resource_tracker.register(shm._name, "shared_memory") # unlink() unregisters
+    shm.unlink()
+
+
+# largest dtype first, so every column is aligned within the block
+shared_column_order = ['probe_ids', 'probe_mid_block', 'probe_std_devs', 'probe_mean_intensities', 'probe_n_beads']
+
+
+class SharedIDATdata:
+    """IDATdata of which the per probe matrix lives in a shared memory block.
+    Pickling only transfers the metadata and the name of the block, so arrays
+    are handed between processes without copying them through a pipe:
+
+        shared = idat_data.to_shared()  # producer, e.g. a worker process
+        idat_data = shared.attach()     # consumer, views the block
+
+    The block exists until release() is called (by either side), or from
+    the start if attached with unlink=True (a one-to-one handoff).
+    """
+
+    @beartype
+    def __init__(self, idat_data: IDATdata):
+        per_probe_matrix = idat_data.get_per_probe_matrix()
+        n = len(per_probe_matrix)
+        self.size = sum(n * np.dtype(probe_sections[_][1]).itemsize for _ in shared_column_order)
+
+        self.shm = open_shared_memory(size=max(self.size, 1))
+        self.name = self.shm.name
+
+        offset = 0
+        for column in shared_column_order:
+            dtype = np.dtype(probe_sections[column][1])
+            np.ndarray((n,), dtype=dtype, buffer=self.shm.buf, offset=offset)[:] = per_probe_matrix[column].to_numpy()
+            offset += n * dtype.itemsize
+
+        self.metadata = copy.copy(idat_data)
+        self.metadata.per_probe_matrix = None
+        self.metadata.source_values = idat_data.get_metadata_source_values() # do not keep the original columns alive
+        self.metadata.chunk_source = None
+        self.metadata.shared_memory = None
+        self.n = n
+
+    def __getstate__(self):
+        return {'name': self.name, 'size': self.size, 'n': self.n, 'metadata': self.metadata}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.shm = None
+
+    @beartype
+    def attach(self, unlink: bool=False) -> IDATdata:
+        """Returns the IDATdata with a per probe matrix viewing the shared block (no copy)."""
+        if self.shm is None:
+            self.shm = open_shared_memory(self.name)
+
+        columns = {}
+        offset = 0
+        for column in shared_column_order:
+            dtype = np.dtype(probe_sections[column][1])
+            columns[column] = np.ndarray((self.n,), dtype=dtype, buffer=self.shm.buf, offset=offset)
+            offset += self.n * dtype.itemsize
+
+        idat_data = copy.copy(self.metadata)
+        idat_data.per_probe_matrix = pd.DataFrame({_: columns[_] for _ in probe_sections}, copy=False)
+        idat_data.shared_memory = self.shm
+
+        if unlink:
+            unlink_shared_memory(self.shm) # the mapping stays valid until it is garbage collected
+
+        return idat_data
+
+    def release(self):
+        """Removes the block; existing views stay valid."""
+        if self.shm is None:
+            self.shm = open_shared_memory(self.name)
+        unlink_shared_memory(self.shm)
+
 
 
 class IDATreader:
 
     @beartype
-    def __init__(self, idat_filename: Path):
+    def __init__(self, idat_filename: Union[Path, str, bytes, bytearray, memoryview, IOBase], probes: Optional[Union[list[int], ndarray]]=None, head_tail: Optional[int]=None, load_per_probe_matrix: bool=True, threads: int=1):
         self.data = IDATdata()
         
-        self.idat_filename = idat_filename
+        if isinstance(idat_filename, (Path, str)):
+            self.idat_filename = Path(idat_filename)
+            self.idat_source = None
+            self.idat_name = str(idat_filename)
+        else: # buffer or binary file-like (BytesIO, tar member, pipe, ...)
+            self.idat_filename = None
+            self.idat_source = idat_filename
+            self.idat_name = str(getattr(idat_filename, 'name', '<' + type(idat_filename).__name__ + '>'))
+
+        self.probes = probes # only parse this subset of probe_ids, if given
+        self.head_tail = head_tail # only parse the first and last elements of the probe sections (preview), if given
+        self.load_per_probe_matrix = load_per_probe_matrix # otherwise the probe sections are read on demand with iter_chunks()
+        self.threads = threads # > 1: read the probe sections concurrently (parallel file systems)
+        self.section_seek_index = None
         self.parse()
     
+    @contextlib.contextmanager
+    def open_source(self):
+        """Yields a seekable binary handle to the IDAT data. Files are opened
+        by path, buffers are wrapped, and non-seekable streams (pipes, stdin)
+        are consumed forward-only, once, and kept in memory for re-use.
+        """
+        if self.idat_filename is not None and self.idat_filename.suffix == ".gz":
+            with gzip.open(self.idat_filename, "rb") as fh_in: # seekable, but backwards seeks are slow
+                yield fh_in
+        elif self.idat_filename is not None:
+            with open(self.idat_filename, "rb") as fh_in:
+                yield fh_in
+        elif isinstance(self.idat_source, (bytes, bytearray, memoryview)):
+            yield BytesIO(self.idat_source)
+        elif self.idat_source.seekable() and self.idat_source.tell() == 0:
+            yield self.idat_source # owned by the caller, so not closed here
+        else:
+            self.idat_source = self.idat_source.read()
+            yield BytesIO(self.idat_source)
+
     @beartype
-    def parse_file_magic(self, fh_in: BufferedReader, section_seek_index: dict) -> str:
+    def parse_file_magic(self, fh_in: IOBase, section_seek_index: dict) -> str:
         fh_in.seek(section_seek_index['FILE_MAGIC'])
         
         return self.data.set_file_magic(read_char(fh_in, 4))
     
     @beartype
-    def parse_idat_version(self, fh_in: BufferedReader, section_seek_index: dict) -> int:
+    def parse_idat_version(self, fh_in: IOBase, section_seek_index: dict) -> int:
         fh_in.seek(section_seek_index['IDAT_VERSION'])
         
         return self.data.set_idat_version(read_long(fh_in))
         
     @beartype
-    def parse_section_index(self, fh_in: BufferedReader, section_seek_index: dict) -> dict:
+    def parse_section_index(self, fh_in: IOBase, section_seek_index: dict) -> dict:
         section_index_order = []
         section_physical_order = {}
 
@@ -346,14 +631,14 @@ class IDATreader:
         return section_seek_index
     
     @beartype
-    def parse_array_n_probes(self, fh_in: BufferedReader, section_seek_index: dict) -> int:
+    def parse_array_n_probes(self, fh_in: IOBase, section_seek_index: dict) -> int:
         fh_in.seek(section_seek_index['ARRAY_N_PROBES'])
         
         return self.data.set_array_n_probes(read_int(fh_in))
 
 
     @beartype
-    def parse_probe_ids(self, fh_in: BufferedReader, section_seek_index: dict) -> ndarray:
+    def parse_probe_ids(self, fh_in: IOBase, section_seek_index: dict) -> ndarray:
         fh_in.seek(section_seek_index['PROBE_IDS'])
         
         if self.data.array_n_probes is None:
@@ -370,7 +655,7 @@ class IDATreader:
         return probe_ids
 
     @beartype
-    def parse_probe_std_devs(self, fh_in: BufferedReader, section_seek_index: dict) -> ndarray:
+    def parse_probe_std_devs(self, fh_in: IOBase, section_seek_index: dict) -> ndarray:
         fh_in.seek(section_seek_index['PROBE_STD_DEVS'])
         
         if self.data.array_n_probes is None:
@@ -384,7 +669,7 @@ class IDATreader:
         return probe_std_devs
 
     @beartype
-    def parse_probe_mean_intensities(self, fh_in: BufferedReader, section_seek_index: dict) -> ndarray:
+    def parse_probe_mean_intensities(self, fh_in: IOBase, section_seek_index: dict) -> ndarray:
         fh_in.seek(section_seek_index['PROBE_MEAN_INTENSITIES'])
         
         if self.data.array_n_probes is None:
@@ -398,7 +683,7 @@ class IDATreader:
         return probe_mean_intensities
 
     @beartype
-    def parse_probe_n_beads(self, fh_in: BufferedReader, section_seek_index: dict) -> ndarray:
+    def parse_probe_n_beads(self, fh_in: IOBase, section_seek_index: dict) -> ndarray:
         fh_in.seek(section_seek_index['PROBE_N_BEADS'])
         
         if self.data.array_n_probes is None:
@@ -412,7 +697,7 @@ class IDATreader:
         return probe_n_beads
 
     @beartype
-    def parse_probe_mid_block(self, fh_in: BufferedReader, section_seek_index: dict) -> ndarray:
+    def parse_probe_mid_block(self, fh_in: IOBase, section_seek_index: dict) -> ndarray:
         fh_in.seek(section_seek_index['PROBE_MID_BLOCK'])
         
         if self.data.array_n_probes is None:
@@ -432,7 +717,7 @@ class IDATreader:
         return probe_mid_block
 
     @beartype
-    def parse_per_probe_matrix(self, fh_in: BufferedReader, section_seek_index: dict) -> DataFrame:
+    def parse_per_probe_matrix(self, fh_in: IOBase, section_seek_index: dict) -> DataFrame:
         per_probe_matrix = pd.DataFrame({
             'probe_ids': self.parse_probe_ids(fh_in, section_seek_index),
             'probe_std_devs': self.parse_probe_std_devs(fh_in, section_seek_index),
@@ -449,7 +734,218 @@ class IDATreader:
         return self.data.set_per_probe_matrix(per_probe_matrix)
 
     @beartype
-    def parse_array_red_green(self, fh_in: BufferedReader, section_seek_index: dict) -> int:
+    def parse_per_probe_matrix_concurrent(self, section_seek_index: dict, threads: int, block_size: int=4 * 1024 * 1024) -> DataFrame:
+        """Reads the probe sections with positional reads (os.pread) from a
+        small thread pool, in blocks of block_size bytes that are written
+        directly into the resulting vectors. Each section is validated as soon
+        as all of its blocks have arrived.
+        """
+        n = self.data.array_n_probes
+
+        fd = os.open(self.idat_filename, os.O_RDONLY)
+        try:
+            n_mid_block = bytearray(4)
+            pread_into(fd, memoryview(n_mid_block), section_seek_index['PROBE_MID_BLOCK'])
+            if n != bytes_to_int(bytes(n_mid_block)):
+                raise Exception("Weird discrepancy between number of probes and size of mid block")
+
+            vectors = {}
+            blocks = []
+            for column, (section, dtype, offset) in probe_sections.items():
+                vectors[column] = np.empty(n, dtype=np.dtype(dtype))
+                buffer = memoryview(vectors[column]).cast('B')
+
+                for start in range(0, len(buffer), block_size):
+                    blocks.append((column, buffer[start:start + block_size], section_seek_index[section] + offset + start))
+
+            blocks_todo = {_: sum(1 for __ in blocks if __[0] == _) for _ in probe_sections}
+
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                futures = {executor.submit(pread_into, fd, buffer, offset): column for column, buffer, offset in blocks}
+
+                for future in as_completed(futures):
+                    future.result() # raises EOFError on truncated files
+
+                    column = futures[future]
+                    blocks_todo[column] -= 1
+                    if blocks_todo[column] == 0:
+                        self.validate_probe_vector(column, vectors[column])
+        finally:
+            os.close(fd)
+
+        per_probe_matrix = pd.DataFrame(vectors)
+
+        if not per_probe_matrix['probe_ids'].equals(per_probe_matrix['probe_mid_block']):
+            raise Exception("Discrepance between probe_ids and probe_mid_block")
+
+        self.per_probe_matrix = per_probe_matrix
+
+        return self.data.set_per_probe_matrix(per_probe_matrix)
+
+    @beartype
+    def validate_probe_vector(self, column: str, vector: ndarray) -> ndarray:
+        """Same checks as the parse_probe_* functions."""
+        if column in ['probe_ids', 'probe_mid_block']:
+            if np.any(vector <= 0):
+                raise Exception("Wrong probe id's found")
+            
+            if np.any(vector[1:] <= vector[:-1]):
+                raise Exception("probe id's are not unique or not incremental")
+
+        return vector
+
+    @beartype
+    def parse_per_probe_matrix_subset(self, fh_in: IOBase, section_seek_index: dict, probes: Union[list[int], ndarray]) -> DataFrame:
+        """Parses only the requested probes. Because probe_ids are strictly
+        incremental, they are located with a binary search over a memory map
+        of PROBE_IDS, and only the pages holding the selected elements of the
+        other sections are read from disk.
+        """
+        n = self.data.array_n_probes
+
+        fh_in.seek(section_seek_index['PROBE_MID_BLOCK'])
+        if n != read_int(fh_in):
+            raise Exception("Weird discrepancy between number of probes and size of mid block")
+
+        def section(name, dtype, offset=0):
+            if self.idat_filename is None or self.idat_filename.suffix == ".gz": # buffers and streams are in memory already, gzip can not be mapped
+                fh_in.seek(section_seek_index[name] + offset)
+                return read_numpy_vector(fh_in, np.dtype(dtype), n)
+
+            return np.memmap(self.idat_filename, dtype=np.dtype(dtype), mode='r', offset=section_seek_index[name] + offset, shape=(n,))
+
+        probe_ids = section('PROBE_IDS', '<u4')
+
+        probes = np.unique(np.asarray(probes, dtype=np.int64))
+        idx = np.searchsorted(probe_ids, probes)
+        idx_found = idx < n
+        idx_found[idx_found] = probe_ids[idx[idx_found]] == probes[idx_found]
+        if not np.all(idx_found):
+            idattools.log.warning(str(np.sum(~idx_found)) + " of the requested probes are not present in: " + self.idat_name)
+        idx = idx[idx_found]
+
+        if len(idx) == 0:
+            raise Exception("None of the requested probes are present in: " + self.idat_name)
+
+        per_probe_matrix = pd.DataFrame({
+            'probe_ids': np.array(probe_ids[idx]),
+            'probe_std_devs': np.array(section('PROBE_STD_DEVS', '<u2')[idx]),
+            'probe_mean_intensities': np.array(section('PROBE_MEAN_INTENSITIES', '<u2')[idx]),
+            'probe_n_beads': np.array(section('PROBE_N_BEADS', '<u1')[idx]),
+            'probe_mid_block': np.array(section('PROBE_MID_BLOCK', '<u4', 4)[idx])
+            })
+
+        if not per_probe_matrix['probe_ids'].equals(per_probe_matrix['probe_mid_block']):
+            raise Exception("Discrepance between probe_ids and probe_mid_block")
+
+        # the subset is a valid array on its own, with a reduced number of probes
+        self.data.set_array_n_probes(len(idx))
+        self.per_probe_matrix = per_probe_matrix
+
+        return self.data.set_per_probe_matrix(per_probe_matrix)
+
+    @beartype
+    def parse_per_probe_matrix_head_tail(self, fh_in: IOBase, section_seek_index: dict, n: int) -> DataFrame:
+        """Reads only the first and last elements of every probe section, by
+        direct seeks. The result is a preview and is therefore not set as
+        self.data.per_probe_matrix (which must always hold the entire array).
+        """
+        n_probes = self.data.array_n_probes
+        n_head = min(n_probes, (n + 1) // 2)
+        n_tail = min(n_probes - n_head, n // 2)
+
+        def head_tail(name, dtype, offset=0):
+            dtype = np.dtype(dtype)
+
+            fh_in.seek(section_seek_index[name] + offset)
+            head = read_numpy_vector(fh_in, dtype, n_head)
+
+            fh_in.seek(section_seek_index[name] + offset + ((n_probes - n_tail) * dtype.itemsize))
+            tail = read_numpy_vector(fh_in, dtype, n_tail)
+
+            return np.concatenate([head, tail])
+
+        per_probe_matrix = pd.DataFrame({
+            'probe_ids': head_tail('PROBE_IDS', '<u4'),
+            'probe_std_devs': head_tail('PROBE_STD_DEVS', '<u2'),
+            'probe_mean_intensities': head_tail('PROBE_MEAN_INTENSITIES', '<u2'),
+            'probe_n_beads': head_tail('PROBE_N_BEADS', '<u1'),
+            'probe_mid_block': head_tail('PROBE_MID_BLOCK', '<u4', 4)
+            }, index=np.concatenate([np.arange(n_head), np.arange(n_probes - n_tail, n_probes)]))
+
+        if not per_probe_matrix['probe_ids'].equals(per_probe_matrix['probe_mid_block']):
+            raise Exception("Discrepance between probe_ids and probe_mid_block")
+
+        self.per_probe_matrix = per_probe_matrix
+
+        return self.per_probe_matrix
+
+    def get_head_tail_str(self) -> str:
+        """Prints the head/tail preview like pandas prints a truncated DataFrame."""
+        lines = self.per_probe_matrix.to_string().split("\n")
+
+        n_head = min(self.data.array_n_probes, (self.head_tail + 1) // 2)
+        if len(self.per_probe_matrix) < self.data.array_n_probes:
+            row = lines[n_head] # last row of the head, without tail (n=1) the dots are appended
+            dots = [" "] * len(row)
+            for m in re.finditer(r"[^ ]+", row): # right-align the dots under each column
+                dots[max(0, m.end() - 3):m.end()] = "..."[-min(3, m.end()):]
+            lines.insert(1 + n_head, "".join(dots).rstrip())
+
+        lines += ["", "[" + str(self.data.array_n_probes) + " rows x " + str(self.per_probe_matrix.shape[1]) + " columns]"]
+
+        return "\n".join(lines)
+
+    @beartype
+    def read_total_intensity(self) -> int:
+        """Reads (only) PROBE_MEAN_INTENSITIES and sums it, vectorized."""
+        with self.open_source() as fh_in:
+            fh_in.seek(self.section_seek_index['PROBE_MEAN_INTENSITIES'])
+
+            return int(read_numpy_vector(fh_in, np.dtype('<u2'), self.data.array_n_probes).sum(dtype=np.uint64))
+
+    @beartype
+    def iter_chunks(self, chunk_probes: int=default_chunk_probes, columns: Optional[list[str]]=None):
+        """Reads the per probe matrix in chunks of at most chunk_probes rows,
+        and only the sections of the requested columns, so that memory usage
+        does not depend on the size of the array.
+        """
+        if columns is None:
+            columns = list(probe_sections.keys())
+
+        n = self.data.array_n_probes
+        last_probe_id = 0
+
+        with self.open_source() as fh_in:
+            if 'probe_mid_block' in columns:
+                fh_in.seek(self.section_seek_index['PROBE_MID_BLOCK'])
+                if n != read_int(fh_in):
+                    raise Exception("Weird discrepancy between number of probes and size of mid block")
+
+            for start in range(0, n, chunk_probes):
+                size = min(chunk_probes, n - start)
+
+                chunk = {}
+                for column in columns:
+                    section, dtype, offset = probe_sections[column]
+                    dtype = np.dtype(dtype)
+
+                    fh_in.seek(self.section_seek_index[section] + offset + (start * dtype.itemsize))
+                    chunk[column] = read_numpy_vector(fh_in, dtype, size)
+
+                if 'probe_ids' in chunk:
+                    probe_ids = chunk['probe_ids']
+                    if probe_ids[0] <= last_probe_id or np.any(probe_ids[1:] <= probe_ids[:-1]):
+                        raise Exception("probe id's are not unique or not incremental")
+                    last_probe_id = probe_ids[-1]
+
+                    if 'probe_mid_block' in chunk and not np.array_equal(probe_ids, chunk['probe_mid_block']):
+                        raise Exception("Discrepance between probe_ids and probe_mid_block")
+
+                yield pd.DataFrame(chunk, index=pd.RangeIndex(start, start + size))
+
+    @beartype
+    def parse_array_red_green(self, fh_in: IOBase, section_seek_index: dict) -> int:
         fh_in.seek(section_seek_index['ARRAY_RED_GREEN'])
         
         red_green = read_int(fh_in)
@@ -460,77 +956,77 @@ class IDATreader:
         return self.data.set_array_red_green(red_green)
 
     @beartype
-    def parse_array_manifest(self, fh_in: BufferedReader, section_seek_index: dict) -> str:
+    def parse_array_manifest(self, fh_in: IOBase, section_seek_index: dict) -> str:
         fh_in.seek(section_seek_index['ARRAY_MANIFEST'])
         
         return self.data.set_array_manifest(read_string(fh_in))
     
     @beartype
-    def parse_array_barcode(self, fh_in: BufferedReader, section_seek_index: dict) -> str:
+    def parse_array_barcode(self, fh_in: IOBase, section_seek_index: dict) -> str:
         fh_in.seek(section_seek_index['ARRAY_BARCODE'])
         
         return self.data.set_array_barcode(read_string(fh_in))
 
     @beartype
-    def parse_array_chip_type(self, fh_in: BufferedReader, section_seek_index: dict) -> str:
+    def parse_array_chip_type(self, fh_in: IOBase, section_seek_index: dict) -> str:
         fh_in.seek(section_seek_index['ARRAY_CHIP_TYPE'])
         
         return self.data.set_array_chip_type(read_string(fh_in))
 
     @beartype
-    def parse_array_chip_label(self, fh_in: BufferedReader, section_seek_index: dict) -> str:
+    def parse_array_chip_label(self, fh_in: IOBase, section_seek_index: dict) -> str:
         fh_in.seek(section_seek_index['ARRAY_CHIP_LABEL'])
         
         try:
             return self.data.set_array_chip_label(read_string(fh_in))
         
         except Exception as e:
-            raise Exception(f"File: {self.idat_filename} -- an error occurred: {e}")
+            raise Exception(f"File: {self.idat_name} -- an error occurred: {e}")
 
     @beartype
-    def parse_array_old_style_manifest(self, fh_in: BufferedReader, section_seek_index: dict) -> str:
+    def parse_array_old_style_manifest(self, fh_in: IOBase, section_seek_index: dict) -> str:
         fh_in.seek(section_seek_index['ARRAY_OLD_STYLE_MANIFEST'])
         
         return self.data.set_array_old_style_manifest(read_string(fh_in))
 
     @beartype
-    def parse_array_unknown_1(self, fh_in: BufferedReader, section_seek_index: dict) -> tuple[int, int, int, int]:
+    def parse_array_unknown_1(self, fh_in: IOBase, section_seek_index: dict) -> tuple[int, int, int, int]:
         fh_in.seek(section_seek_index['ARRAY_UNKNOWN_1'])
         
         return self.data.set_array_unknown_1((read_byte(fh_in), read_byte(fh_in), read_byte(fh_in), read_byte(fh_in)))
 
     @beartype
-    def parse_array_sample_id(self, fh_in: BufferedReader, section_seek_index: dict) -> str:
+    def parse_array_sample_id(self, fh_in: IOBase, section_seek_index: dict) -> str:
         fh_in.seek(section_seek_index['ARRAY_SAMPLE_ID'])
         
         return self.data.set_array_sample_id(read_string(fh_in))
 
     @beartype
-    def parse_array_description(self, fh_in: BufferedReader, section_seek_index: dict) -> str:
+    def parse_array_description(self, fh_in: IOBase, section_seek_index: dict) -> str:
         fh_in.seek(section_seek_index['ARRAY_DESCRIPTION'])
         
         return self.data.set_array_description(read_string(fh_in))
 
     @beartype
-    def parse_array_plate(self, fh_in: BufferedReader, section_seek_index: dict) -> str:
+    def parse_array_plate(self, fh_in: IOBase, section_seek_index: dict) -> str:
         fh_in.seek(section_seek_index['ARRAY_PLATE'])
         
         return self.data.set_array_plate(read_string(fh_in))
 
     @beartype
-    def parse_array_well(self, fh_in: BufferedReader, section_seek_index: dict) -> str:
+    def parse_array_well(self, fh_in: IOBase, section_seek_index: dict) -> str:
         fh_in.seek(section_seek_index['ARRAY_WELL'])
         
         return self.data.set_array_well(read_string(fh_in))
 
     @beartype
-    def parse_array_unknown_2(self, fh_in: BufferedReader, section_seek_index: dict) -> str:
+    def parse_array_unknown_2(self, fh_in: IOBase, section_seek_index: dict) -> str:
         fh_in.seek(section_seek_index['ARRAY_UNKNOWN_2'])
         
         return self.data.set_array_unknown_2(read_string(fh_in))
     
     @beartype
-    def parse_array_run_info(self, fh_in: BufferedReader, section_seek_index: dict) -> list[tuple[str, str, str, str, str]]:
+    def parse_array_run_info(self, fh_in: IOBase, section_seek_index: dict) -> list[tuple[str, str, str, str, str]]:
         fh_in.seek(section_seek_index['ARRAY_RUN_INFO'])
         
         run_info = []
@@ -548,12 +1044,21 @@ class IDATreader:
             'SECTION_INDEX_N': 12
         }
         
-        with open(self.idat_filename, "rb") as fh_in:
+        with self.open_source() as fh_in:
             self.parse_file_magic(fh_in, section_seek_index)
             self.parse_idat_version(fh_in, section_seek_index)
             self.parse_section_index(fh_in, section_seek_index)
             self.parse_array_n_probes(fh_in, section_seek_index)
-            self.parse_per_probe_matrix(fh_in, section_seek_index)
+            if self.head_tail is not None:
+                self.parse_per_probe_matrix_head_tail(fh_in, section_seek_index, self.head_tail)
+            elif not self.load_per_probe_matrix:
+                self.data.chunk_source = self.iter_chunks
+            elif self.probes is None and self.threads > 1 and self.idat_filename is not None and self.idat_filename.suffix != ".gz" and hasattr(os, 'pread'):
+                self.parse_per_probe_matrix_concurrent(section_seek_index, self.threads)
+            elif self.probes is None:
+                self.parse_per_probe_matrix(fh_in, section_seek_index)
+            else:
+                self.parse_per_probe_matrix_subset(fh_in, section_seek_index, self.probes)
             self.parse_array_red_green(fh_in, section_seek_index)
             self.parse_array_manifest(fh_in, section_seek_index)
             self.parse_array_barcode(fh_in, section_seek_index)
@@ -568,8 +1073,22 @@ class IDATreader:
             self.parse_array_unknown_2(fh_in, section_seek_index)
             self.parse_array_run_info(fh_in, section_seek_index)
 
+        self.section_seek_index = section_seek_index
+
+        if self.idat_filename is not None and self.idat_filename.suffix != ".gz" and self.probes is None and self.head_tail is None:
+            self.data.set_source(self.idat_filename, self.get_section_ranges())
+
         return 0
 
+    @beartype
+    def get_section_ranges(self) -> dict:
+        """{section: (offset, size)} of the sections in the file, derived from
+        the offsets of the physically consecutive sections.
+        """
+        offsets = [self.section_seek_index[_] for _ in self.data.section_physical_order] + [os.path.getsize(self.idat_filename)]
+
+        return {section: (offsets[i], offsets[i + 1] - offsets[i]) for i, section in enumerate(self.data.section_physical_order)}
+
 
 
 class IDATwriter(IDATdata):
@@ -585,22 +1104,51 @@ class IDATwriter(IDATdata):
         else:
             raise Exception("Unclear input type")
 
+    @contextlib.contextmanager
+    def open_target(self, idat_filename: Union[Path, str, IOBase], compress_level: int=6, compress_threads: Optional[int]=None):
+        """Paths are opened for writing, binary file-likes (BytesIO, stdout,
+        pipes) are written as-is. Sections are written strictly sequentially,
+        so the target does not need to be seekable. Paths ending with .gz are
+        compressed in parallel blocks.
+        """
+        if isinstance(idat_filename, (Path, str)) and self.data.source is not None and os.path.exists(idat_filename) and os.path.samefile(idat_filename, self.data.source):
+            # the source is still read while writing, so it is replaced only when done
+            tmp_filename = str(idat_filename) + ".tmp"
+            try:
+                with open(tmp_filename, 'wb') as fh_out:
+                    yield fh_out
+                os.replace(tmp_filename, idat_filename)
+            finally:
+                if os.path.exists(tmp_filename):
+                    os.unlink(tmp_filename)
+        elif isinstance(idat_filename, (Path, str)) and str(idat_filename).endswith(".gz"):
+            with open(idat_filename, 'wb') as fh_out:
+                with ParallelGzipWriter(fh_out, compress_level, compress_threads) as fh_out_gz:
+                    yield fh_out_gz
+        elif isinstance(idat_filename, (Path, str)):
+            with open(idat_filename, 'wb') as fh_out:
+                yield fh_out
+        else:
+            yield idat_filename
+            idat_filename.flush()
+
     @beartype
-    def write(self, idat_filename: Path):
-        section_seek_index = { # static entries - todo: make class
-            'FILE_MAGIC': 0,
-            'IDAT_VERSION': 4,
-            'SECTION_INDEX_N': 12
-        }
-        
-        offset = 0
+    def write_probe_section(self, fh_out: IOBase, column: str, chunk_probes: Optional[int]=None) -> int:
+        dtype = np.dtype(probe_sections[column][1])
+        written = 0
 
-        with open(idat_filename, 'wb') as fh_out:
-            offset += write_char(fh_out, self.data.file_magic)
-            offset += write_long(fh_out, self.data.idat_version)
-            offset += write_int(fh_out, len(self.data.section_index_order))
+        for chunk in self.data.iter_chunks(chunk_probes, [column]):
+            written += write_numpy_vector(fh_out, chunk[column].to_numpy(dtype))
+
+        if written != self.data.array_n_probes * dtype.itemsize:
+            raise Exception("Size of " + column + " does not match the number of probes")
 
-            section_sizes = {
+        return written
+
+    @beartype
+    def get_section_sizes(self) -> dict:
+        """Size in bytes of every section, as written by write()"""
+        return {
                 "ARRAY_N_PROBES": 4,
                 "PROBE_IDS": (4 * self.data.array_n_probes),
                 "PROBE_STD_DEVS": (2 * self.data.array_n_probes),
@@ -616,12 +1164,61 @@ class IDATwriter(IDATdata):
                 "ARRAY_OLD_STYLE_MANIFEST": binary_string_len(self.data.array_old_style_manifest),
                 "ARRAY_UNKNOWN_1": 1 + 1 + 1 + 1,
                 "ARRAY_SAMPLE_ID": binary_string_len(self.data.array_sample_id),
-                "ARRAY_DESCRIPTION": binary_string_len(self.data.array_sample_id),
+                "ARRAY_DESCRIPTION": binary_string_len(self.data.array_description),
                 "ARRAY_PLATE": binary_string_len(self.data.array_plate),
-                "ARRAY_WELL": binary_string_len(self.data.array_plate),
-                "ARRAY_UNKNOWN_2": binary_string_len(self.data.array_plate)
+                "ARRAY_WELL": binary_string_len(self.data.array_well),
+                "ARRAY_UNKNOWN_2": binary_string_len(self.data.array_unknown_2)
             }
 
+    @beartype
+    def get_passthrough_sections(self) -> dict:
+        """{section: (offset, size)} of the sections that are copied as-is from
+        the source: those not marked by set_modified, of the same size, and
+        still equal to the values read (source_values). Probe sections that
+        are not in memory are read from the source as they are.
+        """
+        if self.data.source is None:
+            return {}
+
+        section_sizes = self.get_section_sizes()
+        columns = {section: column for column, (section, _, _) in probe_sections.items()}
+
+        passthrough_sections = {}
+        for section, source_range in self.data.source_sections.items():
+            if source_range[1] != section_sizes[section]:
+                unchanged = False
+            elif section in columns and self.data.per_probe_matrix is None:
+                unchanged = True
+            elif section not in self.data.source_values:
+                unchanged = False
+            elif section in columns:
+                unchanged = np.array_equal(self.data.source_values[section].to_numpy(), self.data.per_probe_matrix[columns[section]].to_numpy())
+            else:
+                unchanged = self.data.source_values[section] == getattr(self.data, section.lower())
+
+            if unchanged:
+                passthrough_sections[section] = source_range
+
+        return passthrough_sections
+
+    @beartype
+    def write(self, idat_filename: Union[Path, str, IOBase], chunk_probes: Optional[int]=None, compress_level: int=6, compress_threads: Optional[int]=None):
+        section_seek_index = { # static entries - todo: make class
+            'FILE_MAGIC': 0,
+            'IDAT_VERSION': 4,
+            'SECTION_INDEX_N': 12
+        }
+        
+        offset = 0
+        passthrough_sections = self.get_passthrough_sections()
+
+        with self.open_target(idat_filename, compress_level, compress_threads) as fh_out:
+            offset += write_char(fh_out, self.data.file_magic)
+            offset += write_long(fh_out, self.data.idat_version)
+            offset += write_int(fh_out, len(self.data.section_index_order))
+
+            section_sizes = self.get_section_sizes()
+
             offset_virtual = offset # should be 16
             offset_virtual += len(self.data.section_index_order) * (2 + 8)
 
@@ -638,19 +1235,22 @@ class IDATwriter(IDATdata):
 
 
             for section in self.data.section_physical_order: # keep original order of sections in file
-                if section == "ARRAY_N_PROBES":
+                if section in passthrough_sections:
+                    # unmodified since reading, copy the raw bytes rather than re-encoding
+                    offset += copy_range(self.data.source, fh_out, *passthrough_sections[section])
+                elif section == "ARRAY_N_PROBES":
                     offset += write_int(fh_out, self.data.array_n_probes)
                 elif section == "PROBE_IDS":
-                    offset += write_numpy_vector(fh_out, self.data.per_probe_matrix["probe_ids"].to_numpy("<u4"))
+                    offset += self.write_probe_section(fh_out, "probe_ids", chunk_probes)
                 elif section == "PROBE_STD_DEVS":
-                    offset += write_numpy_vector(fh_out, self.data.per_probe_matrix["probe_std_devs"].to_numpy("<u2"))
+                    offset += self.write_probe_section(fh_out, "probe_std_devs", chunk_probes)
                 elif section == "PROBE_MEAN_INTENSITIES":
-                    offset += write_numpy_vector(fh_out, self.data.per_probe_matrix["probe_mean_intensities"].to_numpy("<u2"))
+                    offset += self.write_probe_section(fh_out, "probe_mean_intensities", chunk_probes)
                 elif section == "PROBE_N_BEADS":
-                    offset += write_numpy_vector(fh_out, self.data.per_probe_matrix["probe_n_beads"].to_numpy("<u1"))
+                    offset += self.write_probe_section(fh_out, "probe_n_beads", chunk_probes)
                 elif section == "PROBE_MID_BLOCK":
                     offset += write_int(fh_out, self.data.array_n_probes)
-                    offset += write_numpy_vector(fh_out, self.data.per_probe_matrix["probe_mid_block"].to_numpy("<u4"))
+                    offset += self.write_probe_section(fh_out, "probe_mid_block", chunk_probes)
                 elif section == "ARRAY_RED_GREEN":
                     offset += write_int(fh_out, self.data.array_red_green)
                 elif section == "ARRAY_MANIFEST":
@@ -699,7 +1299,58 @@ class IDATmixer:
             raise Exception("Unclear input type (idat_reference)")
 
     @beartype
-    def mix(self, idat_mixed_in: IDATdata,  mixed_in_fraction: float, output_file: Path):
+    def get_mixed_chunk_source(self, idat_mixed_in: IDATdata, mixed_in_fraction: float):
+        """Returns a chunk_source that mixes both arrays chunk by chunk, so
+        that the writer only needs one chunk of each array in memory.
+        """
+        data_idat_ref = self.data_idat_ref
+
+        def mixed_chunks(chunk_probes, columns):
+            if columns is None:
+                columns = list(probe_sections.keys())
+
+            # id columns are taken from ref and compared with mixed-in, value columns are mixed
+            columns_id = [_ for _ in columns if _ in ['probe_ids', 'probe_mid_block']]
+            columns_value = [_ for _ in columns if _ not in columns_id]
+
+            for data_left, data_right in zip(data_idat_ref.iter_chunks(chunk_probes, columns), idat_mixed_in.iter_chunks(chunk_probes, columns)):
+                new_data = {}
+
+                for column in columns_id:
+                    if np.any(data_left[column].to_numpy() != data_right[column].to_numpy()):
+                        raise Exception("Arrays have different " + column + " (or ordering?)")
+                    new_data[column] = data_left[column].to_numpy()
+
+                for column in columns_value:
+                    new_data[column] = np.round((data_left[column].to_numpy() * (1 - mixed_in_fraction)) + (data_right[column].to_numpy() * (mixed_in_fraction))).astype(probe_sections[column][1])
+
+                yield pd.DataFrame({_: new_data[_] for _ in columns}, index=data_left.index)
+
+        return mixed_chunks
+
+    @beartype
+    def check_probe_ids(self, idat_mixed_in: IDATdata, chunk_probes: int=default_chunk_probes) -> int:
+        """Compares the id columns of both arrays chunk by chunk, so that a
+        mismatch is found before anything is written.
+        """
+        columns = ['probe_ids', 'probe_mid_block']
+        n = 0
+
+        for data_left, data_right in zip(self.data_idat_ref.iter_chunks(chunk_probes, columns), idat_mixed_in.iter_chunks(chunk_probes, columns)):
+            for column in columns:
+                if not np.array_equal(data_left[column].to_numpy(), data_right[column].to_numpy()):
+                    raise Exception("Arrays have different " + column + " (or ordering?)")
+            n += len(data_left)
+
+        return n
+
+    @beartype
+    def mix(self, idat_mixed_in: IDATdata,  mixed_in_fraction: float, output_file: Union[Path, IOBase], chunk_probes: Optional[int]=None, compress_level: int=6, compress_threads: Optional[int]=None):
+        """Writes the mix to output_file and returns it. With chunk_probes the
+        probe sections are mixed chunk by chunk while writing, and the returned
+        IDATdata has no per_probe_matrix in memory (get_per_probe_matrix() mixes
+        it again from the inputs).
+        """
         if isinstance(idat_mixed_in, IDATdata):
             pass # ok
         elif isinstance(idat_mixed_in, IDATreader):
@@ -707,6 +1358,11 @@ class IDATmixer:
         else:
             raise Exception("Unclear input type (idat_mixed_in)")
 
+        # the mixed data has no source of its own, so opening an input as output would truncate it
+        for idat_data in [self.data_idat_ref, idat_mixed_in]:
+            if isinstance(output_file, Path) and idat_data.source is not None and os.path.exists(output_file) and os.path.samefile(output_file, idat_data.source):
+                raise Exception("Output is the same file as an input: " + str(output_file))
+
         idattools.log.debug("Initializing new IDATdata object")
         mixed_data = IDATdata()
         # check file_magic
@@ -779,7 +1435,7 @@ class IDATmixer:
         else:
             mixed_data.set_array_unknown_2(self.data_idat_ref.array_unknown_2)
 
-        if re.match("^[0-9]{12}_R[0-9]{2}C[0-9]{2}.+idat$", os.path.basename(output_file)):
+        if isinstance(output_file, Path) and re.match("^[0-9]{12}_R[0-9]{2}C[0-9]{2}.+idat(\\.gz)?$", os.path.basename(output_file)):
             barcode = os.path.basename(output_file).split("_")[0]
             chip_label = os.path.basename(output_file).split("_")[1][0:6]
         else:
@@ -796,48 +1452,49 @@ class IDATmixer:
         mixed_data.set_array_chip_label(chip_label)
         idattools.log.debug("sentrix_id of mixed output file: " + mixed_data.get_sentrix_id())
 
-        if np.any(self.data_idat_ref.per_probe_matrix.columns != idat_mixed_in.per_probe_matrix.columns):
-            raise Exception("Different data columns in the arrays")
-
-
-        data_left = self.data_idat_ref.per_probe_matrix
-        data_right = idat_mixed_in.per_probe_matrix
         if self.data_idat_ref.array_n_probes != idat_mixed_in.array_n_probes:
             idattools.log.warning("Different sized arrays are merged ("+str(self.data_idat_ref.array_n_probes)+" ~ "+str(idat_mixed_in.array_n_probes)+") - reduing to intersect:")
+
+            # the intersect is made in memory
+            data_left = self.data_idat_ref.get_per_probe_matrix()
+            data_right = idat_mixed_in.get_per_probe_matrix()
             
             shared_probes = set(data_left["probe_ids"]).intersection(set(data_right["probe_ids"]))
             
             data_left = data_left[data_left["probe_ids"].isin(shared_probes)].reset_index(drop=True)
             data_right = data_right[data_right["probe_ids"].isin(shared_probes)].reset_index(drop=True)
 
-            data_left_midblock = data_left[data_left["probe_ids"].isin(shared_probes)].reset_index(drop=True)
-            data_right_midblock = data_right[data_right["probe_ids"].isin(shared_probes)].reset_index(drop=True)
-
             mixed_data.set_array_n_probes(len(shared_probes))
             
             idattools.log.warning("Size intersected array: " + str(len(shared_probes)) + " probes")
-            
-        else:
-            mixed_data.set_array_n_probes(self.data_idat_ref.array_n_probes)
 
-        if np.any(data_left["probe_ids"] != data_right["probe_ids"]):
-            raise Exception("Arrays have different probe_ids (or ordering?)")
-            
-        if np.any(data_left["probe_mid_block"] != data_right["probe_mid_block"]):
-            raise Exception("Arrays have different probe_mid_block id's (or ordering?)")
+            if np.any(data_left["probe_ids"] != data_right["probe_ids"]):
+                raise Exception("Arrays have different probe_ids (or ordering?)")
+                
+            if np.any(data_left["probe_mid_block"] != data_right["probe_mid_block"]):
+                raise Exception("Arrays have different probe_mid_block id's (or ordering?)")
 
+            new_data = pd.DataFrame({
+                'probe_ids': data_left["probe_ids"],
+                
+                'probe_std_devs': round((data_left["probe_std_devs"] * (1 - mixed_in_fraction)) + (data_right["probe_std_devs"] * (mixed_in_fraction))).to_numpy("<u2"),
+                'probe_mean_intensities': round((data_left["probe_mean_intensities"] * (1 - mixed_in_fraction)) + (data_right["probe_mean_intensities"] * (mixed_in_fraction))).to_numpy("<u2"),
+                'probe_n_beads': round((data_left["probe_n_beads"] * (1 - mixed_in_fraction)) + (data_right["probe_n_beads"] * (mixed_in_fraction))).to_numpy("<u1"),
+                
+                'probe_mid_block': data_left["probe_mid_block"]
+                })
 
-        new_data = pd.DataFrame({
-            'probe_ids': data_left["probe_ids"],
-            
-            'probe_std_devs': round((data_left["probe_std_devs"] * (1 - mixed_in_fraction)) + (data_right["probe_std_devs"] * (mixed_in_fraction))).to_numpy("<u2"),
-            'probe_mean_intensities': round((data_left["probe_mean_intensities"] * (1 - mixed_in_fraction)) + (data_right["probe_mean_intensities"] * (mixed_in_fraction))).to_numpy("<u2"),
-            'probe_n_beads': round((data_left["probe_n_beads"] * (1 - mixed_in_fraction)) + (data_right["probe_n_beads"] * (mixed_in_fraction))).to_numpy("<u1"),
-            
-            'probe_mid_block': data_left["probe_mid_block"]
-            })
+            mixed_data.set_per_probe_matrix(new_data)
+
+        else:
+            mixed_data.set_array_n_probes(self.data_idat_ref.array_n_probes)
+            mixed_data.chunk_source = self.get_mixed_chunk_source(idat_mixed_in, mixed_in_fraction)
 
-        mixed_data.set_per_probe_matrix(new_data)
+            # the probe ids are checked before the output file is opened
+            if chunk_probes is None:
+                mixed_data.get_per_probe_matrix()
+            else:
+                self.check_probe_ids(idat_mixed_in, chunk_probes)
 
 
 
@@ -864,7 +1521,7 @@ class IDATmixer:
         mixed_data.set_array_run_info(ri)
         
         w = IDATwriter(mixed_data)
-        w.write(output_file)
+        w.write(output_file, chunk_probes, compress_level, compress_threads)
         
         return mixed_data
 
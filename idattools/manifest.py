@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+# Illumina manifest (e.g. MethylationEPIC_v2.0_..._manifest.csv) loader. The
+# CSV is parsed once into a compact binary index (numpy .npz) that is cached
+# next to the manifest and re-used as long as the CSV does not change.
+
+import idattools # log
+
+from pathlib import Path
+import csv
+import os
+
+from beartype import beartype
+from typing import Optional
+
+import numpy as np
+from numpy import ndarray
+
+
+
+design_types = {'I': 1, 'II': 2}
+color_channels = {'': 0, 'Red': 1, 'Grn': 2}
+
+
+class IDATmanifest:
+    """Maps the address ids (probe_ids in IDAT files) to CpG probes.
+
+    Arrays (one element per CpG probe):
+        names          -- IlmnID / Name of the probe
+        address_a      -- AddressA_ID (type I: unmethylated, type II: both)
+        address_b      -- AddressB_ID (type I: methylated, type II: 0)
+        design_type    -- 1 (Infinium I) or 2 (Infinium II)
+        color_channel  -- 0 (none, type II), 1 (Red) or 2 (Grn)
+    """
+
+    @beartype
+    def __init__(self, manifest_filename: Path, cache_filename: Optional[Path]=None):
+        self.manifest_filename = manifest_filename
+        self.cache_filename = cache_filename if cache_filename is not None else Path(str(manifest_filename) + ".idx.npz")
+
+        self.names = None
+        self.address_a = None
+        self.address_b = None
+        self.design_type = None
+        self.color_channel = None
+
+        if not self.load_cache():
+            self.parse()
+            self.write_cache()
+
+    def __len__(self):
+        return len(self.names)
+
+    def get_cache_key(self) -> ndarray:
+        stat = os.stat(self.manifest_filename)
+        return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+    @beartype
+    def load_cache(self) -> bool:
+        if not os.path.exists(self.cache_filename):
+            return False
+
+        with np.load(self.cache_filename, allow_pickle=False) as cache:
+            if not np.array_equal(cache['key'], self.get_cache_key()):
+                idattools.log.info("Manifest has changed, rebuilding index: " + str(self.cache_filename))
+                return False
+
+            self.names = cache['names']
+            self.address_a = cache['address_a']
+            self.address_b = cache['address_b']
+            self.design_type = cache['design_type']
+            self.color_channel = cache['color_channel']
+
+        return True
+
+    @beartype
+    def write_cache(self) -> Path:
+        tmp_filename = str(self.cache_filename) + ".tmp.npz"
+        np.savez(tmp_filename,
+                 key=self.get_cache_key(),
+                 names=self.names,
+                 address_a=self.address_a,
+                 address_b=self.address_b,
+                 design_type=self.design_type,
+                 color_channel=self.color_channel)
+        os.replace(tmp_filename, self.cache_filename) # atomic, concurrent jobs may share the cache
+
+        return self.cache_filename
+
+    @beartype
+    def parse(self) -> int:
+        """Parses the [Assay] block of the manifest CSV; the [Controls] block is skipped."""
+        names, address_a, address_b, design_type, color_channel = [], [], [], [], []
+
+        with open(self.manifest_filename, "r", newline='') as fh_in:
+            for line in fh_in:
+                if line.startswith("[Assay]"):
+                    break
+            else:
+                fh_in.seek(0) # not a sectioned manifest, header on the first line
+
+            reader = csv.reader(fh_in)
+            header = next(reader)
+            col = {_: i for i, _ in enumerate(header)}
+            for _ in ['AddressA_ID', 'AddressB_ID', 'Infinium_Design_Type', 'Color_Channel']:
+                if _ not in col:
+                    raise Exception("Manifest lacks column: " + _)
+            col_name = col['IlmnID'] if 'IlmnID' in col else col['Name']
+
+            for row in reader:
+                if len(row) == 0:
+                    continue
+                if row[0].startswith("["):
+                    break
+
+                if row[col['Infinium_Design_Type']] not in design_types:
+                    raise Exception("Unknown Infinium design type: " + row[col['Infinium_Design_Type']])
+
+                names.append(row[col_name])
+                address_a.append(int(row[col['AddressA_ID']]))
+                address_b.append(int(row[col['AddressB_ID']]) if row[col['AddressB_ID']] != "" else 0)
+                design_type.append(design_types[row[col['Infinium_Design_Type']]])
+                color_channel.append(color_channels[row[col['Color_Channel']]])
+
+        self.names = np.array(names, dtype=str)
+        self.address_a = np.array(address_a, dtype='<u4')
+        self.address_b = np.array(address_b, dtype='<u4')
+        self.design_type = np.array(design_type, dtype='<u1')
+        self.color_channel = np.array(color_channel, dtype='<u1')
+
+        idattools.log.debug("Parsed manifest with " + str(len(self.names)) + " probes: " + str(self.manifest_filename))
+
+        return len(self.names)
+
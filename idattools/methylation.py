@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+# Beta and M-values from Grn/Red IDAT pairs, using an IDATmanifest. The
+# manifest addresses are located in the (sorted) probe_ids by binary search,
+# and the intensities are gathered by index rather than joined.
+#
+#   Infinium II: methylated = Grn[A], unmethylated = Red[A]
+#   Infinium I:  methylated = C[B],   unmethylated = C[A], C = color channel
+
+import idattools # log
+from .idat import IDATdata, IDATreader
+from .manifest import IDATmanifest, color_channels
+
+from pathlib import Path
+
+from beartype import beartype
+from typing import Union
+
+import numpy as np
+from numpy import ndarray
+
+import pandas as pd
+from pandas import DataFrame
+
+
+
+class IDATmethylation:
+    @beartype
+    def __init__(self, manifest: IDATmanifest, offset: float=100.0, alpha: float=1.0):
+        self.manifest = manifest
+        self.offset = offset # beta = M / (M + U + offset)
+        self.alpha = alpha # M-value = log2((M + alpha) / (U + alpha))
+
+        self.type_1 = manifest.design_type == 1
+        self.type_1_red = self.type_1 & (manifest.color_channel == color_channels['Red'])
+        self.type_1_grn = self.type_1 & (manifest.color_channel == color_channels['Grn'])
+
+        self._probe_ids = None
+        self._index = None
+
+    @beartype
+    def get_index(self, probe_ids: ndarray) -> tuple[ndarray, ndarray, ndarray, ndarray]:
+        """Positions of address A and B in probe_ids and whether they were
+        found. Arrays of the same type share probe_ids, so the last index is
+        kept and re-used.
+        """
+        if self._probe_ids is not None and np.array_equal(self._probe_ids, probe_ids):
+            return self._index
+
+        def locate(addresses):
+            idx = np.searchsorted(probe_ids, addresses)
+            idx[idx >= len(probe_ids)] = 0
+            return idx, probe_ids[idx] == addresses
+
+        idx_a, found_a = locate(self.manifest.address_a)
+        idx_b, found_b = locate(self.manifest.address_b)
+
+        n_missing = np.sum(~found_a)
+        if n_missing > 0:
+            idattools.log.warning(str(n_missing) + " manifest probes are not present on the array")
+
+        self._probe_ids = probe_ids
+        self._index = (idx_a, found_a, idx_b, found_b)
+
+        return self._index
+
+    @beartype
+    def get_methylated_unmethylated(self, grn: Union[IDATdata, IDATreader], red: Union[IDATdata, IDATreader]) -> tuple[ndarray, ndarray]:
+        if isinstance(grn, IDATreader):
+            grn = grn.data
+        if isinstance(red, IDATreader):
+            red = red.data
+
+        probe_ids = grn.per_probe_matrix['probe_ids'].to_numpy()
+        if not np.array_equal(probe_ids, red.per_probe_matrix['probe_ids'].to_numpy()):
+            raise Exception("Grn and Red arrays have different probe_ids: " + grn.get_sentrix_id() + " and " + red.get_sentrix_id())
+
+        grn_intensities = grn.per_probe_matrix['probe_mean_intensities'].to_numpy(np.float64)
+        red_intensities = red.per_probe_matrix['probe_mean_intensities'].to_numpy(np.float64)
+
+        idx_a, found_a, idx_b, found_b = self.get_index(probe_ids)
+
+        # Infinium II
+        methylated = grn_intensities[idx_a]
+        unmethylated = red_intensities[idx_a]
+
+        # Infinium I
+        methylated[self.type_1_red] = red_intensities[idx_b[self.type_1_red]]
+        unmethylated[self.type_1_red] = red_intensities[idx_a[self.type_1_red]]
+        methylated[self.type_1_grn] = grn_intensities[idx_b[self.type_1_grn]]
+        unmethylated[self.type_1_grn] = grn_intensities[idx_a[self.type_1_grn]]
+
+        missing = ~found_a | (self.type_1 & ~found_b)
+        methylated[missing] = np.nan
+        unmethylated[missing] = np.nan
+
+        return methylated, unmethylated
+
+    @beartype
+    def get_beta_values(self, grn: Union[IDATdata, IDATreader], red: Union[IDATdata, IDATreader]) -> ndarray:
+        methylated, unmethylated = self.get_methylated_unmethylated(grn, red)
+
+        return methylated / (methylated + unmethylated + self.offset)
+
+    @beartype
+    def get_m_values(self, grn: Union[IDATdata, IDATreader], red: Union[IDATdata, IDATreader]) -> ndarray:
+        methylated, unmethylated = self.get_methylated_unmethylated(grn, red)
+
+        return np.log2((methylated + self.alpha) / (unmethylated + self.alpha))
+
+    @beartype
+    def get_matrix(self, pairs: dict[str, tuple[Path, Path]], m_values: bool=False, io_threads: int=1) -> DataFrame:
+        """Computes a (probes x samples) matrix for {sample: (grn_file, red_file)}.
+        Only one pair of arrays is in memory at a time.
+        """
+        matrix = np.empty((len(self.manifest), len(pairs)), dtype=np.float32)
+
+        for i, (grn_file, red_file) in enumerate(pairs.values()):
+            grn = IDATreader(grn_file, threads=io_threads).data
+            red = IDATreader(red_file, threads=io_threads).data
+
+            matrix[:, i] = self.get_m_values(grn, red) if m_values else self.get_beta_values(grn, red)
+
+        return pd.DataFrame(matrix, index=pd.Index(self.manifest.names, name='probe'), columns=list(pairs.keys()))
+
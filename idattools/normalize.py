@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+
+# Out-of-core quantile normalization: intensities of all arrays are spilled
+# to a memory-mapped (samples x probes) matrix, so only one array (or one
+# chunk of rows) needs to be in RAM at any time.
+#
+# The reference distribution is the sum of the sorted intensities of every
+# sample (rank sums), divided by the number of samples. Rank sums of subsets
+# of the samples add up, so the reference can be built in shards, merged,
+# and then applied to every shard. Reference files are TSV:
+#
+#   #n_samples <tab> n
+#   probe_id <tab> rank_sum
+#   (one line per shared probe: its id, and the sum of the values of that rank)
+
+import idattools # log
+from .idat import IDATreader, IDATwriter
+
+from pathlib import Path
+import os
+import tempfile
+
+from beartype import beartype
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from numpy import ndarray
+
+
+
+@beartype
+def write_reference(fh_out, probe_ids: ndarray, rank_sums: ndarray, n_samples: int) -> int:
+    """Writes rank sums (integers, exact) of n_samples samples, see the header of this file."""
+    fh_out.write("#n_samples\t" + str(n_samples) + "\n")
+    fh_out.write("probe_id\trank_sum\n")
+    for probe_id, rank_sum in zip(probe_ids.tolist(), rank_sums.astype(np.int64).tolist()):
+        fh_out.write(str(probe_id) + "\t" + str(rank_sum) + "\n")
+
+    return len(probe_ids)
+
+
+@beartype
+def read_reference(fh_in) -> tuple[ndarray, ndarray, int]:
+    """Returns (probe_ids, rank_sums, n_samples); a shard header is skipped."""
+    line = fh_in.readline()
+    if line.startswith("#idat-tools-shard"):
+        line = fh_in.readline()
+
+    fields = line.rstrip("\n").split("\t")
+    if len(fields) != 2 or fields[0] != "#n_samples" or fh_in.readline() != "probe_id\trank_sum\n":
+        raise Exception("Invalid quantile normalization reference")
+
+    values = np.array(fh_in.read().split(), dtype=np.int64).reshape(-1, 2)
+
+    return values[:, 0].astype('<u4'), values[:, 1].astype(np.float64), int(fields[1])
+
+
+@beartype
+def _sort_rows(matrix_filename: str, shape: tuple[int, int], row_from: int, row_to: int) -> ndarray:
+    """Sorts the rows [row_from, row_to) of the memory-mapped intensity
+    matrix and returns their column-wise sum (partial reference).
+    """
+    matrix = np.memmap(matrix_filename, dtype='<u2', mode='r', shape=shape)
+
+    partial_sum = np.zeros(shape[1], dtype=np.float64)
+    for i in range(row_from, row_to):
+        partial_sum += np.sort(matrix[i])
+
+    return partial_sum
+
+
+class IDATnormalizer:
+    """Quantile normalizes the probe_mean_intensities of many IDAT files
+    without keeping all of them in memory.
+    """
+
+    @beartype
+    def __init__(self, idat_filenames: list[Path], tmp_dir: Optional[Path]=None, threads: int=1, chunk_size: int=64):
+        if threads < 1 or chunk_size < 1:
+            raise Exception("Invalid number of threads or chunk size")
+
+        self.idat_filenames = idat_filenames
+        self.tmp_dir = tmp_dir
+        self.threads = threads
+        self.chunk_size = chunk_size
+
+        self.probe_ids = None
+        self.reference = None
+
+    @beartype
+    def read_columns(self, idat_filename: Path, columns: list[str]) -> dict[str, ndarray]:
+        """Reads only the sections of the requested columns."""
+        reader = IDATreader(idat_filename, load_per_probe_matrix=False)
+        chunk = next(reader.iter_chunks(reader.data.array_n_probes, columns))
+
+        return {_: chunk[_].to_numpy() for _ in columns}
+
+    @beartype
+    def find_shared_probes(self) -> ndarray:
+        probe_ids = None
+
+        for idat_filename in self.idat_filenames:
+            ids = self.read_columns(idat_filename, ['probe_ids'])['probe_ids']
+
+            if probe_ids is None:
+                probe_ids = ids
+            elif not np.array_equal(probe_ids, ids):
+                idattools.log.warning("Different sized or ordered arrays are normalized - reducing to intersect")
+                probe_ids = np.intersect1d(probe_ids, ids, assume_unique=True)
+
+        if len(probe_ids) == 0:
+            raise Exception("Arrays do not share any probes")
+
+        self.probe_ids = probe_ids
+        return self.probe_ids
+
+    @beartype
+    def spill(self, matrix_filename: str) -> np.memmap:
+        """Writes the aligned intensities of every file as a row of the memory-mapped matrix."""
+        shape = (len(self.idat_filenames), len(self.probe_ids))
+        matrix = np.memmap(matrix_filename, dtype='<u2', mode='w+', shape=shape)
+
+        for i, idat_filename in enumerate(self.idat_filenames):
+            columns = self.read_columns(idat_filename, ['probe_ids', 'probe_mean_intensities'])
+            probe_ids = columns['probe_ids']
+
+            # probe_ids are strictly incremental, so the intersect can be located by binary search
+            idx = np.searchsorted(probe_ids, self.probe_ids)
+            idx[idx >= len(probe_ids)] = 0
+            if not np.array_equal(probe_ids[idx], self.probe_ids): # only with a given reference
+                raise Exception("Array lacks probes of the reference: " + str(idat_filename))
+            matrix[i] = columns['probe_mean_intensities'][idx]
+
+        matrix.flush()
+        return matrix
+
+    @beartype
+    def get_rank_sums(self, matrix_filename: str, shape: tuple[int, int]) -> ndarray:
+        """Sorts every sample in parallel chunks and accumulates the rank sums incrementally."""
+        chunks = [(_, min(_ + self.chunk_size, shape[0])) for _ in range(0, shape[0], self.chunk_size)]
+
+        reference = np.zeros(shape[1], dtype=np.float64)
+        if self.threads == 1:
+            for row_from, row_to in chunks:
+                reference += _sort_rows(matrix_filename, shape, row_from, row_to)
+        else:
+            with ProcessPoolExecutor(max_workers=self.threads) as executor:
+                for partial_sum in executor.map(_sort_rows, *zip(*[(matrix_filename, shape, _[0], _[1]) for _ in chunks])):
+                    reference += partial_sum
+
+        return reference
+
+    @beartype
+    def build_reference(self, matrix_filename: str, shape: tuple[int, int]) -> ndarray:
+        self.reference = self.get_rank_sums(matrix_filename, shape) / shape[0]
+        return self.reference
+
+    @beartype
+    def set_reference(self, probe_ids: ndarray, rank_sums: ndarray, n_samples: int) -> ndarray:
+        """Uses a (merged) reference instead of building one from the files."""
+        if n_samples < 2:
+            raise Exception("Quantile normalization requires at least two IDAT files")
+
+        self.probe_ids = probe_ids
+        self.reference = rank_sums / n_samples
+        return self.reference
+
+    @beartype
+    def build_partial_reference(self) -> tuple[ndarray, ndarray, int]:
+        """Returns (probe_ids, rank_sums, n_samples) of these files only, to be
+        added to those of other shards (see IDATmerger).
+        """
+        if len(self.idat_filenames) == 0:
+            return np.array([], dtype='<u4'), np.array([], dtype=np.float64), 0
+
+        self.find_shared_probes()
+
+        with tempfile.TemporaryDirectory(dir=self.tmp_dir) as tmp_dir:
+            matrix_filename = os.path.join(tmp_dir, "intensities.u2")
+            matrix = self.spill(matrix_filename)
+            rank_sums = self.get_rank_sums(matrix_filename, matrix.shape)
+            del matrix
+
+        return self.probe_ids, rank_sums, len(self.idat_filenames)
+
+    @beartype
+    def normalize(self, output_dir: Path) -> list[Path]:
+        """Normalizes every file to the reference given with set_reference(),
+        or to the reference of these files.
+        """
+        if self.reference is None and len(self.idat_filenames) < 2:
+            raise Exception("Quantile normalization requires at least two IDAT files")
+
+        os.makedirs(output_dir, exist_ok=True)
+        if len(self.idat_filenames) == 0:
+            return []
+
+        if self.reference is None:
+            self.find_shared_probes()
+
+        with tempfile.TemporaryDirectory(dir=self.tmp_dir) as tmp_dir:
+            matrix_filename = os.path.join(tmp_dir, "intensities.u2")
+            matrix = self.spill(matrix_filename)
+            if self.reference is None:
+                self.build_reference(matrix_filename, matrix.shape)
+
+            reference = np.clip(np.round(self.reference), 0, np.iinfo(np.uint16).max).astype('<u2')
+
+            output_files = []
+            for i, idat_filename in enumerate(self.idat_filenames):
+                idat = IDATreader(idat_filename).data
+                per_probe_matrix = idat.per_probe_matrix
+
+                if len(per_probe_matrix) != len(self.probe_ids):
+                    per_probe_matrix = per_probe_matrix[per_probe_matrix['probe_ids'].isin(self.probe_ids)].reset_index(drop=True)
+                    idat.set_array_n_probes(len(self.probe_ids))
+                else:
+                    per_probe_matrix = per_probe_matrix.copy()
+
+                normalized = np.empty(len(self.probe_ids), dtype='<u2')
+                normalized[np.argsort(matrix[i], kind='stable')] = reference
+                per_probe_matrix['probe_mean_intensities'] = normalized
+                idat.set_per_probe_matrix(per_probe_matrix)
+
+                output_file = Path(output_dir) / os.path.basename(idat_filename)
+                idattools.log.debug("Writing normalized file: " + str(output_file))
+
+                # IDATwriter keeps the section_physical_order of the source file
+                IDATwriter(idat).write(output_file)
+                output_files.append(output_file)
+
+            del matrix
+
+        return output_files
+
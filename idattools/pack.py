@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+
+# Packed multi-sample container (.idatpack). The probe ids are stored once,
+# followed by one record per sample, appended at the end of the file:
+#
+#   header:  'IDATPACK', version (int), n_probes (int), probe_ids (<u4 x n)
+#   record:  'SMPL', metadata length (int), metadata (JSON),
+#            probe_std_devs (<u2 x n), probe_mean_intensities (<u2 x n),
+#            probe_n_beads (<u1 x n)
+#
+# Header and records are padded to multiples of 8 bytes. The metadata holds
+# every per-sample field of IDATdata, so samples are exported losslessly as
+# IDAT files. Appending does not rewrite existing records; the columns of a
+# sample are read through a memory map (random access).
+
+import idattools # log
+from .idat import IDATdata, IDATwriter, probe_sections
+from .utils import *
+
+from pathlib import Path
+import json
+import os
+
+from beartype import beartype
+from typing import Optional, Union
+
+import numpy as np
+from numpy import ndarray
+
+import pandas as pd
+
+
+
+pack_version = 1
+pack_columns = ['probe_std_devs', 'probe_mean_intensities', 'probe_n_beads']
+metadata_fields = ['file_magic', 'idat_version', 'section_index_order', 'section_physical_order', 'array_n_probes', 'array_red_green', 'array_manifest', 'array_barcode', 'array_chip_type', 'array_chip_label', 'array_old_style_manifest', 'array_unknown_1', 'array_sample_id', 'array_description', 'array_plate', 'array_well', 'array_unknown_2', 'array_run_info']
+
+
+def padding(size: int) -> int:
+    return (-size) % 8
+
+
+class IDATpack:
+    """Reads and appends to an .idatpack file. The file is created by the
+    first append if it does not exist.
+    """
+
+    @beartype
+    def __init__(self, pack_filename: Path):
+        self.pack_filename = pack_filename
+
+        self.probe_ids = None
+        self.names = [] # file names the samples were appended as
+        self.metadata = []
+        self.record_offsets = [] # offset of the columns of every sample
+        self.end = 0 # end of the last complete record
+
+        self._memmap = None
+
+        if os.path.exists(self.pack_filename):
+            self.parse()
+
+    def __len__(self):
+        return len(self.names)
+
+    def record_size(self) -> int:
+        size = sum(len(self.probe_ids) * np.dtype(probe_sections[_][1]).itemsize for _ in pack_columns)
+        return size + padding(size)
+
+    @beartype
+    def parse(self) -> int:
+        """Reads the header and walks over the records (only their metadata is read)."""
+        file_size = os.path.getsize(self.pack_filename)
+
+        with open(self.pack_filename, "rb") as fh_in:
+            if fh_in.read(8) != b"IDATPACK":
+                raise Exception("Invalid file format: " + str(self.pack_filename))
+
+            version = read_int(fh_in)
+            if version != pack_version:
+                raise Exception("Unsupported idatpack version: " + str(version))
+
+            n_probes = read_int(fh_in)
+            self.probe_ids = read_numpy_vector(fh_in, np.dtype('<u4'), n_probes)
+            offset = fh_in.seek(padding(fh_in.tell()), os.SEEK_CUR)
+            self.end = offset
+
+            record_size = self.record_size()
+            while offset < file_size:
+                fh_in.seek(offset)
+                if file_size - offset < 8 or read_char(fh_in, 4) != "SMPL":
+                    raise Exception("Corrupt record at offset " + str(offset) + ": " + str(self.pack_filename))
+
+                metadata_size = read_int(fh_in)
+                record_offset = offset + 8 + metadata_size + padding(8 + metadata_size)
+                if record_offset + record_size > file_size:
+                    idattools.log.warning("Incomplete last record (interrupted append?) is ignored: " + str(self.pack_filename))
+                    break
+
+                metadata = json.loads(fh_in.read(metadata_size).decode('utf-8'))
+                self.names.append(metadata.pop('name'))
+                self.metadata.append(metadata)
+                self.record_offsets.append(record_offset)
+
+                offset = record_offset + record_size
+                self.end = offset
+
+        return len(self.names)
+
+    @beartype
+    def get_index(self, sample: Union[int, str]) -> int:
+        """Samples are addressed by position, file name or sentrix id."""
+        if isinstance(sample, int):
+            if sample < 0 or sample >= len(self.names):
+                raise Exception("Sample out of range: " + str(sample))
+            return sample
+
+        for i, name in enumerate(self.names):
+            if name == sample or sample == self.metadata[i]['array_barcode'] + "_" + self.metadata[i]['array_chip_label']:
+                return i
+
+        raise Exception("Sample not found: " + sample)
+
+    @beartype
+    def get(self, sample: Union[int, str]) -> IDATdata:
+        """Returns the sample with a per probe matrix viewing the memory map
+        (read-only, use .copy() before in-place edits).
+        """
+        i = self.get_index(sample)
+
+        if self._memmap is None:
+            self._memmap = np.memmap(self.pack_filename, dtype=np.uint8, mode='r', shape=(self.end,))
+
+        n = len(self.probe_ids)
+        columns = {'probe_ids': self.probe_ids, 'probe_mid_block': self.probe_ids}
+        offset = self.record_offsets[i]
+        for column in pack_columns:
+            dtype = np.dtype(probe_sections[column][1])
+            columns[column] = self._memmap[offset:offset + (n * dtype.itemsize)].view(dtype)
+            offset += n * dtype.itemsize
+
+        idat_data = IDATdata()
+        for field, value in self.metadata[i].items():
+            if field == 'array_unknown_1':
+                value = tuple(value)
+            elif field == 'array_run_info':
+                value = [tuple(_) for _ in value]
+            getattr(idat_data, 'set_' + field)(value)
+
+        idat_data.set_per_probe_matrix(pd.DataFrame({_: columns[_] for _ in probe_sections}, copy=False))
+
+        return idat_data
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.get(i)
+
+    @beartype
+    def append(self, idat_data: IDATdata, name: Optional[str]=None) -> int:
+        """Appends a sample at the end of the file, without rewriting it."""
+        per_probe_matrix = idat_data.get_per_probe_matrix()
+        probe_ids = per_probe_matrix['probe_ids'].to_numpy()
+
+        if self.probe_ids is None:
+            self.probe_ids = probe_ids.copy()
+            with open(self.pack_filename, "wb") as fh_out:
+                fh_out.write(b"IDATPACK")
+                write_int(fh_out, pack_version)
+                write_int(fh_out, len(self.probe_ids))
+                write_numpy_vector(fh_out, self.probe_ids)
+                fh_out.write(b"\0" * padding(fh_out.tell()))
+                self.end = fh_out.tell()
+        elif not np.array_equal(self.probe_ids, probe_ids):
+            raise Exception("Probe ids of " + idat_data.get_sentrix_id() + " differ from the probe ids of the pack")
+
+        metadata = {field: getattr(idat_data, field) for field in metadata_fields}
+        name = name if name is not None else idat_data.get_sentrix_id() + ".idat"
+        metadata_bytes = json.dumps(dict(metadata, name=name)).encode('utf-8')
+        metadata_bytes += b" " * padding(8 + len(metadata_bytes))
+
+        with open(self.pack_filename, "r+b") as fh_out:
+            fh_out.truncate(self.end) # drops an incomplete record
+            fh_out.seek(self.end)
+
+            write_char(fh_out, "SMPL")
+            write_int(fh_out, len(metadata_bytes))
+            fh_out.write(metadata_bytes)
+            record_offset = fh_out.tell()
+            for column in pack_columns:
+                write_numpy_vector(fh_out, per_probe_matrix[column].to_numpy().astype(probe_sections[column][1], copy=False))
+            fh_out.write(b"\0" * padding(fh_out.tell()))
+
+            self.end = fh_out.tell()
+
+        self.names.append(name)
+        self.metadata.append(json.loads(json.dumps(metadata))) # as parsed from the file (lists instead of tuples)
+        self.record_offsets.append(record_offset)
+        self._memmap = None
+
+        return len(self.names) - 1
+
+    @beartype
+    def export(self, sample: Union[int, str], output_file: Path) -> Path:
+        IDATwriter(self.get(sample)).write(output_file)
+
+        return output_file
+
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+# Asynchronous prefetching of IDAT files, for storage where the latency per
+# file (NFS, object-store mounts) rather than the bandwidth is the limit.
+#
+#   async for data in iter_idats(paths, concurrency=8):
+#       ...
+
+from .idat import IDATdata, IDATreader
+
+from pathlib import Path
+import asyncio
+import collections
+
+from beartype import beartype
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+
+
+
+@beartype
+def _read_idat(idat_filename: Path, probes) -> IDATdata:
+    return IDATreader(idat_filename, probes=probes).data
+
+
+async def iter_idats(idat_filenames: list[Path], concurrency: int=4, ordered: bool=True, probes=None, executor: Optional[ThreadPoolExecutor]=None):
+    """Parses the given IDAT files in a thread pool and yields their IDATdata.
+
+    At most `concurrency` files are being read or are parsed-but-not-yet
+    yielded at any time, which bounds the memory in flight. With
+    ordered=True files are yielded in the order given, otherwise as soon as
+    they are completed.
+    """
+    if concurrency < 1:
+        raise Exception("Invalid concurrency: " + str(concurrency))
+
+    loop = asyncio.get_running_loop()
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="idat-prefetch")
+
+    pending = collections.deque()
+    todo = iter(idat_filenames)
+
+    def submit():
+        for idat_filename in todo:
+            pending.append(loop.run_in_executor(executor, _read_idat, Path(idat_filename), probes))
+            return True
+        return False
+
+    try:
+        for i in range(concurrency):
+            if not submit():
+                break
+
+        while pending:
+            if ordered:
+                data = await pending.popleft()
+            else:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                future = done.pop()
+                pending.remove(future)
+                data = future.result()
+
+            submit() # keep the number of files in flight constant
+            yield data
+
+    finally:
+        for future in pending:
+            future.cancel()
+
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
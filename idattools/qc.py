@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+# Per-array quality control metrics, computed in a single (vectorized) pass
+# over the probe sections of every file. The distribution sketches (see
+# sketch.py) can be computed in the same pass.
+
+import idattools # log
+from .idat import IDATdata, IDATreader
+from .sketch import get_sketch_from_data
+
+from pathlib import Path
+import json
+
+from beartype import beartype
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+
+@beartype
+def parse_run_info(array_run_info: list[tuple[str, str, str, str, str]]) -> dict:
+    """Sums the decoding statistics over all Decoding entries and collects
+    the scanner of the Scan entries. The parameters are stored as
+    'CallsToUsed=2798107|CallsToUnused=1889|CallsToInvalid=49292'.
+    """
+    stats = {'decoding_calls_used': 0, 'decoding_calls_unused': 0, 'decoding_calls_invalid': 0, 'scanner_ids': set(), 'scan_dates': []}
+
+    for date, block_type, parameters, software, version in array_run_info:
+        parameters = dict(_.split("=", 1) for _ in parameters.split("|") if "=" in _)
+
+        if block_type == "Decoding":
+            stats['decoding_calls_used'] += int(parameters.get('CallsToUsed', 0))
+            stats['decoding_calls_unused'] += int(parameters.get('CallsToUnused', 0))
+            stats['decoding_calls_invalid'] += int(parameters.get('CallsToInvalid', 0))
+        elif block_type == "Scan":
+            if 'ScannerID' in parameters:
+                stats['scanner_ids'].add(parameters['ScannerID'])
+            stats['scan_dates'].append(date)
+
+    n_calls = stats['decoding_calls_used'] + stats['decoding_calls_unused'] + stats['decoding_calls_invalid']
+    stats['decoding_frac_invalid'] = (stats['decoding_calls_invalid'] / n_calls) if n_calls > 0 else None
+    stats['scanner_ids'] = ",".join(sorted(stats['scanner_ids']))
+    stats['scan_date'] = stats['scan_dates'][0] if len(stats['scan_dates']) > 0 else ""
+    del stats['scan_dates']
+
+    return stats
+
+
+@beartype
+def get_qc_metrics(idat_data: IDATdata, min_beads: int=3) -> dict:
+    per_probe_matrix = idat_data.per_probe_matrix
+
+    intensities = per_probe_matrix['probe_mean_intensities'].to_numpy()
+    std_devs = per_probe_matrix['probe_std_devs'].to_numpy()
+    n_beads = per_probe_matrix['probe_n_beads'].to_numpy()
+
+    n = idat_data.array_n_probes
+    q = np.percentile(intensities, [5, 25, 50, 75, 95])
+
+    metrics = {
+        'sentrix_id': idat_data.get_sentrix_id(),
+        'chip_type': idat_data.array_chip_type,
+        'n_probes': n,
+        'frac_low_beads': float(np.count_nonzero(n_beads < min_beads)) / n,
+        'frac_zero_beads': float(np.count_nonzero(n_beads == 0)) / n,
+        'median_beads': float(np.median(n_beads)),
+        'n_zero_intensity': int(np.count_nonzero(intensities == 0)),
+        'frac_zero_intensity': float(np.count_nonzero(intensities == 0)) / n,
+        'mean_intensity': float(intensities.mean()),
+        'intensity_p05': float(q[0]),
+        'intensity_p25': float(q[1]),
+        'intensity_p50': float(q[2]),
+        'intensity_p75': float(q[3]),
+        'intensity_p95': float(q[4]),
+        'median_std_dev': float(np.median(std_devs)),
+    }
+    metrics.update(parse_run_info(idat_data.array_run_info))
+
+    return metrics
+
+
+def _get_qc_metrics_file(idat_filename: Path, min_beads: int, io_threads: int, sketch: bool=False) -> tuple[dict, Optional[dict]]:
+    idat_data = IDATreader(idat_filename, threads=io_threads).data
+
+    metrics = {'file': str(idat_filename)}
+    metrics.update(get_qc_metrics(idat_data, min_beads))
+
+    return metrics, (get_sketch_from_data(idat_data, idat_filename) if sketch else None)
+
+
+class IDATqc:
+    @beartype
+    def __init__(self, idat_filenames: list[Path], min_beads: int=3, threads: int=1, io_threads: int=1, sketch: bool=False):
+        self.idat_filenames = idat_filenames
+        self.min_beads = min_beads
+        self.threads = threads
+        self.io_threads = io_threads
+
+        self.sketch = sketch
+        self.sketches = {} # {file: sketch}, filled while iterating if sketch=True
+
+    def __iter__(self):
+        """Yields the metrics per file, in the order of the files."""
+        n = len(self.idat_filenames)
+
+        if self.threads == 1:
+            results = (_get_qc_metrics_file(_, self.min_beads, self.io_threads, self.sketch) for _ in self.idat_filenames)
+            for idat_filename, (metrics, sketch) in zip(self.idat_filenames, results):
+                if sketch is not None:
+                    self.sketches[idat_filename] = sketch
+                yield metrics
+        else:
+            with ProcessPoolExecutor(max_workers=self.threads) as executor:
+                results = executor.map(_get_qc_metrics_file, self.idat_filenames, [self.min_beads] * n, [self.io_threads] * n, [self.sketch] * n, chunksize=4)
+                for idat_filename, (metrics, sketch) in zip(self.idat_filenames, results):
+                    if sketch is not None:
+                        self.sketches[idat_filename] = sketch
+                    yield metrics
+
+    def write(self, fh_out, output_format: str="tsv") -> int:
+        n = 0
+
+        for metrics in self:
+            if output_format == "json": # one json object per line
+                fh_out.write(json.dumps(metrics) + "\n")
+            elif output_format == "tsv":
+                if n == 0:
+                    fh_out.write("\t".join(metrics.keys()) + "\n")
+                fh_out.write("\t".join(("" if _ is None else str(_)) for _ in metrics.values()) + "\n")
+            else:
+                raise Exception("Unknown output format: " + output_format)
+
+            n += 1
+
+        return n
+
@@ -0,0 +1,295 @@
+#!/usr/bin/env python
+
+# Local query daemon: keeps parsed arrays in a bounded (LRU) cache and
+# answers queries over a Unix domain socket, so that short-lived pipeline
+# processes do not have to re-open and re-parse the same IDAT files.
+#
+# Messages are a JSON header followed by the raw buffers of the numpy arrays
+# it describes (no pickling), each preceded by its length:
+#
+#   header length (int), header (JSON), arrays (dtype and shape in header)
+
+import idattools # log
+from .idat import IDATreader, probe_sections
+from .pack import metadata_fields
+
+from pathlib import Path
+import collections
+import json
+import os
+import re
+import socket
+import socketserver
+import stat
+import threading
+import time
+
+from beartype import beartype
+from typing import Optional
+
+import numpy as np
+from numpy import ndarray
+
+
+
+@beartype
+def recv_exactly(sock: socket.socket, buffer: memoryview) -> int:
+    n_read = 0
+
+    while n_read < len(buffer):
+        n = sock.recv_into(buffer[n_read:])
+        if n == 0:
+            raise EOFError("Connection closed")
+        n_read += n
+
+    return n_read
+
+
+@beartype
+def send_message(sock: socket.socket, header: dict, arrays: Optional[list[ndarray]]=None) -> None:
+    arrays = [np.ascontiguousarray(_) for _ in (arrays if arrays is not None else [])]
+    header = dict(header, arrays=[[_.dtype.str, list(_.shape)] for _ in arrays])
+    header = json.dumps(header).encode('utf-8')
+
+    sock.sendall(len(header).to_bytes(4, byteorder="little") + header)
+    for array in arrays:
+        sock.sendall(memoryview(array).cast('B'))
+
+
+@beartype
+def recv_message(sock: socket.socket) -> tuple[dict, list[ndarray]]:
+    size = bytearray(4)
+    recv_exactly(sock, memoryview(size))
+    header = bytearray(int.from_bytes(size, byteorder="little"))
+    recv_exactly(sock, memoryview(header))
+    header = json.loads(header.decode('utf-8'))
+
+    arrays = []
+    for dtype, shape in header.pop('arrays'):
+        array = np.empty(shape, dtype=np.dtype(dtype))
+        recv_exactly(sock, memoryview(array).cast('B'))
+        arrays.append(array)
+
+    return header, arrays
+
+
+@beartype
+def get_sample_name(idat_filename: Path) -> str:
+    """'203927450093_R01C01_Grn.idat.gz' -> '203927450093_R01C01_Grn'"""
+    return re.sub(r"\.idat(\.gz)?$", "", idat_filename.name)
+
+
+class IDATcache:
+    """Bounded LRU cache of parsed arrays, with hit and latency counters."""
+
+    @beartype
+    def __init__(self, idat_filenames: list[Path], cache_size: int=64):
+        if cache_size < 1:
+            raise Exception("Invalid cache size")
+
+        self.idat_filenames = {}
+        for idat_filename in idat_filenames:
+            sample = get_sample_name(idat_filename)
+            if sample in self.idat_filenames:
+                raise Exception("Duplicate sample name: " + sample)
+            self.idat_filenames[sample] = idat_filename
+
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.latency = {} # {request: [n, total seconds, max seconds]}
+
+    @beartype
+    def get(self, sample: str):
+        if sample not in self.idat_filenames:
+            raise Exception("Unknown sample: " + sample)
+
+        with self.lock:
+            if sample in self.cache:
+                self.hits += 1
+                self.cache.move_to_end(sample)
+                return self.cache[sample]
+            self.misses += 1
+
+        # parsed outside the lock, concurrent misses of the same sample may both parse it
+        idat_data = IDATreader(self.idat_filenames[sample]).data
+
+        with self.lock:
+            self.cache[sample] = idat_data
+            self.cache.move_to_end(sample)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+        return idat_data
+
+    @beartype
+    def get_values(self, samples: list[str], probe_ids: Optional[ndarray]=None, column: str='probe_mean_intensities') -> tuple[ndarray, ndarray]:
+        """Returns a (samples x probes) matrix of column values, and whether
+        every probe was found (missing probes have value 0).
+        """
+        if column not in probe_sections:
+            raise Exception("Unknown column: " + column)
+
+        values, found = None, None
+        for i, sample in enumerate(samples):
+            per_probe_matrix = self.get(sample).per_probe_matrix
+            sample_ids = per_probe_matrix['probe_ids'].to_numpy()
+            sample_values = per_probe_matrix[column].to_numpy()
+
+            if probe_ids is None:
+                probe_ids = sample_ids
+
+            if values is None:
+                values = np.zeros((len(samples), len(probe_ids)), dtype=sample_values.dtype)
+                found = np.zeros((len(samples), len(probe_ids)), dtype=bool)
+
+            if len(sample_ids) == len(probe_ids) and np.array_equal(sample_ids, probe_ids):
+                values[i] = sample_values
+                found[i] = True
+            else:
+                # probe_ids are strictly incremental, so the probes can be located by binary search
+                idx = np.searchsorted(sample_ids, probe_ids)
+                idx[idx >= len(sample_ids)] = 0
+                found[i] = sample_ids[idx] == probe_ids
+                values[i, found[i]] = sample_values[idx[found[i]]]
+
+        return values, found
+
+    @beartype
+    def get_metadata(self, sample: str) -> dict:
+        idat_data = self.get(sample)
+
+        metadata = {field: getattr(idat_data, field) for field in metadata_fields}
+        metadata['file'] = str(self.idat_filenames[sample])
+
+        return metadata
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            n = self.hits + self.misses
+
+            return {
+                'n_samples': len(self.idat_filenames),
+                'cache_size': self.cache_size,
+                'cached': len(self.cache),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / n) if n > 0 else None,
+                'latency': {request: {'n': count, 'mean_ms': 1000 * total / count, 'max_ms': 1000 * maximum} for request, (count, total, maximum) in self.latency.items()},
+            }
+
+    @beartype
+    def add_latency(self, request: str, seconds: float) -> None:
+        with self.lock:
+            count, total, maximum = self.latency.get(request, (0, 0.0, 0.0))
+            self.latency[request] = (count + 1, total + seconds, max(maximum, seconds))
+
+
+class IDATrequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        cache = self.server.cache
+
+        while True:
+            try:
+                header, arrays = recv_message(self.request)
+            except EOFError:
+                return
+
+            time_start = time.perf_counter()
+            request = header.get('request')
+            try:
+                if request == 'values':
+                    values, found = cache.get_values(header['samples'], arrays[0] if len(arrays) > 0 else None, header.get('column', 'probe_mean_intensities'))
+                    send_message(self.request, {}, [values, found])
+                elif request == 'probe_ids':
+                    send_message(self.request, {}, [cache.get(header['sample']).per_probe_matrix['probe_ids'].to_numpy()])
+                elif request == 'metadata':
+                    send_message(self.request, {'metadata': cache.get_metadata(header['sample'])})
+                elif request == 'samples':
+                    send_message(self.request, {'samples': list(cache.idat_filenames.keys())})
+                elif request == 'stats':
+                    send_message(self.request, {'stats': cache.get_stats()})
+                else:
+                    raise Exception("Unknown request: " + str(request))
+            except Exception as e:
+                send_message(self.request, {'error': type(e).__name__ + ": " + str(e)})
+
+            cache.add_latency(str(request), time.perf_counter() - time_start)
+
+
+class IDATserver(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    @beartype
+    def __init__(self, socket_filename: Path, cache: IDATcache):
+        if os.path.exists(socket_filename):
+            if not stat.S_ISSOCK(os.stat(socket_filename).st_mode):
+                raise Exception("Not a socket: " + str(socket_filename))
+            os.unlink(socket_filename) # stale socket of a previous daemon
+
+        self.socket_filename = socket_filename
+        self.cache = cache
+
+        super().__init__(str(socket_filename), IDATrequestHandler)
+
+    def serve(self):
+        idattools.log.info("Serving " + str(len(self.cache.idat_filenames)) + " samples on: " + str(self.socket_filename))
+
+        try:
+            self.serve_forever()
+        finally:
+            self.server_close()
+            os.unlink(self.socket_filename)
+
+
+class IDATclient:
+    """Client of IDATserver; one connection is re-used for all requests."""
+
+    @beartype
+    def __init__(self, socket_filename: Path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(str(socket_filename))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.sock.close()
+
+    @beartype
+    def request(self, header: dict, arrays: Optional[list[ndarray]]=None) -> tuple[dict, list[ndarray]]:
+        send_message(self.sock, header, arrays)
+        header, arrays = recv_message(self.sock)
+
+        if 'error' in header:
+            raise Exception(header['error'])
+
+        return header, arrays
+
+    @beartype
+    def get_values(self, samples: list[str], probe_ids: Optional[ndarray]=None, column: str='probe_mean_intensities') -> tuple[ndarray, ndarray]:
+        """Returns (values, found) as (samples x probes) matrices; all probes of the first sample if probe_ids is None."""
+        header, arrays = self.request({'request': 'values', 'samples': samples, 'column': column}, [] if probe_ids is None else [np.asarray(probe_ids, dtype='<u4')])
+
+        return arrays[0], arrays[1]
+
+    @beartype
+    def get_probe_ids(self, sample: str) -> ndarray:
+        return self.request({'request': 'probe_ids', 'sample': sample})[1][0]
+
+    @beartype
+    def get_metadata(self, sample: str) -> dict:
+        return self.request({'request': 'metadata', 'sample': sample})[0]['metadata']
+
+    def get_samples(self) -> list[str]:
+        return self.request({'request': 'samples'})[0]['samples']
+
+    def get_stats(self) -> dict:
+        return self.request({'request': 'stats'})[0]['stats']
+
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+
+# Deterministic sharding of batch commands over nodes. Shard i of N processes
+# the i-th contiguous slice of the inputs (in the order given), and writes a
+# partial output that starts with a line identifying the shard:
+#
+#   #idat-tools-shard <tab> kind <tab> i <tab> N
+#
+# Merging the partials of all N shards (in shard order) reproduces the output
+# of the unsharded command exactly. Partial quantile normalization references
+# (rank sums, see normalize.py) are merged by adding them up.
+#
+# correlate is not sharded: every block of sample pairs needs the samples of
+# both blocks, so slices of the inputs do not yield mergeable partials.
+
+import idattools # log
+from .normalize import read_reference, write_reference
+
+from pathlib import Path
+import itertools
+import re
+
+from beartype import beartype
+
+import numpy as np
+
+
+
+shard_magic = "#idat-tools-shard"
+shard_kinds = ['qc-tsv', 'qc-json', 'beta', 'mix-batch', 'normalize-reference']
+
+
+@beartype
+def parse_shard(shard: str) -> tuple[int, int]:
+    """'3/8' -> (3, 8), shards are numbered from 0"""
+    match = re.match(r"^([0-9]+)/([0-9]+)$", shard)
+    if not match or int(match.group(2)) < 1 or int(match.group(1)) >= int(match.group(2)):
+        raise Exception("Invalid shard (expected i/N with 0 <= i < N): " + shard)
+
+    return int(match.group(1)), int(match.group(2))
+
+
+@beartype
+def get_shard(items: list, shard_index: int, n_shards: int) -> list:
+    """Contiguous slice of the items, the slices of all shards differ at most one in size."""
+    return items[(shard_index * len(items)) // n_shards:((shard_index + 1) * len(items)) // n_shards]
+
+
+@beartype
+def get_shard_header(kind: str, shard_index: int, n_shards: int) -> str:
+    if kind not in shard_kinds:
+        raise Exception("Unknown kind of partial output: " + kind)
+
+    return "\t".join([shard_magic, kind, str(shard_index), str(n_shards)]) + "\n"
+
+
+class IDATmerger:
+    """Combines the partial outputs of all shards of a job."""
+
+    @beartype
+    def __init__(self, partial_filenames: list[Path]):
+        partials = {}
+        kinds = set()
+        n_shards = set()
+
+        for partial_filename in partial_filenames:
+            with open(partial_filename, "r") as fh_in:
+                fields = fh_in.readline().rstrip("\n").split("\t")
+
+            if len(fields) != 4 or fields[0] != shard_magic or fields[1] not in shard_kinds:
+                raise Exception("Not a partial output of a sharded command: " + str(partial_filename))
+
+            kinds.add(fields[1])
+            n_shards.add(int(fields[3]))
+            if int(fields[2]) in partials:
+                raise Exception("Shard " + fields[2] + " is given twice: " + str(partials[int(fields[2])]) + " and " + str(partial_filename))
+            partials[int(fields[2])] = partial_filename
+
+        if len(kinds) != 1 or len(n_shards) != 1:
+            raise Exception("Partial outputs of different jobs: " + ", ".join(sorted(kinds)) + " (" + ", ".join(str(_) for _ in sorted(n_shards)) + " shards)")
+
+        self.kind = kinds.pop()
+        self.n_shards = n_shards.pop()
+
+        missing = [str(_) for _ in range(self.n_shards) if _ not in partials]
+        if len(missing) > 0:
+            raise Exception("Missing shards: " + ", ".join(missing) + " (of " + str(self.n_shards) + ")")
+
+        self.partial_filenames = [partials[_] for _ in range(self.n_shards)]
+
+    def iter_lines(self, partial_filename: Path):
+        """Lines of a partial output, without the shard header."""
+        with open(partial_filename, "r") as fh_in:
+            fh_in.readline()
+            yield from fh_in
+
+    @beartype
+    def merge(self, fh_out) -> int:
+        """Writes the merged output, returns the number of lines written."""
+        n = 0
+
+        if self.kind == 'beta':
+            # probes x samples: partials are column blocks with the same probes (rows)
+            partials = [self.iter_lines(_) for _ in self.partial_filenames]
+            for lines in itertools.zip_longest(*partials):
+                if any(_ is None for _ in lines):
+                    raise Exception("Partial beta matrices have a different number of probes")
+
+                fields = [_.rstrip("\n").split("\t", 1) for _ in lines]
+                if any(_[0] != fields[0][0] for _ in fields):
+                    raise Exception("Partial beta matrices have different probes: " + fields[0][0])
+
+                fh_out.write("\t".join([fields[0][0]] + [_[1] for _ in fields if len(_) > 1]) + "\n") # shards without samples have no values
+                n += 1
+        elif self.kind == 'normalize-reference':
+            probe_ids, rank_sums, n_samples = None, None, 0
+            for partial_filename in self.partial_filenames:
+                with open(partial_filename, "r") as fh_in:
+                    partial_probe_ids, partial_rank_sums, partial_n_samples = read_reference(fh_in)
+
+                if partial_n_samples == 0: # shard without samples
+                    continue
+
+                if probe_ids is None:
+                    probe_ids, rank_sums = partial_probe_ids, partial_rank_sums
+                elif not np.array_equal(probe_ids, partial_probe_ids):
+                    raise Exception("Shards have different (shared) probes, the reference can not be merged: " + str(partial_filename))
+                else:
+                    rank_sums = rank_sums + partial_rank_sums
+                n_samples += partial_n_samples
+
+            if probe_ids is None:
+                raise Exception("None of the shards has samples")
+
+            n = write_reference(fh_out, probe_ids, rank_sums, n_samples)
+        elif self.kind == 'mix-batch':
+            # the outputs were written by the shards, their logs of completed rows are combined
+            done = set()
+            for partial_filename in self.partial_filenames:
+                for line in self.iter_lines(partial_filename):
+                    if line.endswith("\n") and line not in done:
+                        done.add(line)
+                        fh_out.write(line)
+                        n += 1
+        else:
+            # qc: rows of samples, the tsv header is only taken from the first (non-empty) shard
+            has_header = False
+            for partial_filename in self.partial_filenames:
+                for j, line in enumerate(self.iter_lines(partial_filename)):
+                    if self.kind == 'qc-tsv' and j == 0:
+                        if has_header:
+                            continue
+                        has_header = True
+                    fh_out.write(line)
+                    n += 1
+
+        idattools.log.info("Merged " + str(self.n_shards) + " shards (" + self.kind + ")")
+
+        return n
+
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+# Simulation of technical replicates of an array, for power analyses. Each
+# replicate draws new probe_mean_intensities from the standard error of the
+# bead-level mean: N(mean, std_dev / sqrt(n_beads)), optionally after
+# down-sampling the beads.
+
+import idattools # log
+from .idat import IDATdata, IDATreader, IDATwriter
+
+from pathlib import Path
+import copy
+import os
+import string
+
+from beartype import beartype
+from typing import Optional
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from numpy import ndarray
+
+
+
+_worker_simulator = None
+
+def _init_worker(simulator):
+    global _worker_simulator
+    _worker_simulator = simulator
+
+def _write_replicates_worker(replicates: list[int], seeds: list, output_dir: Path, name_template: str) -> list[Path]:
+    return _worker_simulator.write_replicates(replicates, seeds, output_dir, name_template)
+
+
+class IDATsimulator:
+    @beartype
+    def __init__(self, idat_data: IDATdata, seed: Optional[int]=None, bead_fraction: float=1.0):
+        if isinstance(idat_data, IDATdata):
+            self.data = idat_data
+        elif isinstance(idat_data, IDATreader):
+            self.data = idat_data.data
+        else:
+            raise Exception("Unclear input type")
+
+        if bead_fraction <= 0 or bead_fraction > 1:
+            raise Exception("Invalid bead fraction: " + str(bead_fraction))
+
+        self.seed = seed
+        self.bead_fraction = bead_fraction
+
+        self.probe_mean_intensities = self.data.per_probe_matrix['probe_mean_intensities'].to_numpy(np.float64)
+        self.probe_std_devs = self.data.per_probe_matrix['probe_std_devs'].to_numpy(np.float64)
+        self.probe_n_beads = self.data.per_probe_matrix['probe_n_beads'].to_numpy()
+
+    @beartype
+    def spawn_seeds(self, n_replicates: int) -> list:
+        """One independent RNG stream per replicate, so that the results do not
+        depend on chunking or the number of processes.
+        """
+        return np.random.SeedSequence(self.seed).spawn(n_replicates)
+
+    def draw_replicate(self, seed) -> tuple[ndarray, ndarray]:
+        """Returns (probe_mean_intensities, probe_n_beads) of a single replicate."""
+        rng = np.random.default_rng(seed)
+
+        n_beads = self.probe_n_beads
+        if self.bead_fraction < 1.0:
+            n_beads = rng.binomial(n_beads, self.bead_fraction).astype('<u1')
+
+        # probes without beads have no (estimate of the) variance and are kept as is
+        std_err = np.divide(self.probe_std_devs, np.sqrt(n_beads), out=np.zeros_like(self.probe_std_devs), where=n_beads > 0)
+        probe_mean_intensities = rng.normal(self.probe_mean_intensities, std_err)
+
+        return np.clip(np.round(probe_mean_intensities), 0, np.iinfo(np.uint16).max).astype('<u2'), n_beads
+
+    @beartype
+    def replicate(self, seed) -> IDATdata:
+        probe_mean_intensities, probe_n_beads = self.draw_replicate(seed)
+
+        per_probe_matrix = self.data.per_probe_matrix.copy(deep=False)
+        per_probe_matrix['probe_mean_intensities'] = probe_mean_intensities
+        per_probe_matrix['probe_n_beads'] = probe_n_beads
+
+        replicate = copy.copy(self.data) # metadata is shared, only the matrix is new
+        replicate.set_per_probe_matrix(per_probe_matrix)
+
+        return replicate
+
+    @beartype
+    def write_replicates(self, replicates: list[int], seeds: list, output_dir: Path, name_template: str) -> list[Path]:
+        output_files = []
+
+        for i, seed in zip(replicates, seeds):
+            output_file = output_dir / name_template.format(sentrix_id=self.data.get_sentrix_id(), i=i + 1)
+            IDATwriter(self.replicate(seed)).write(output_file)
+            output_files.append(output_file)
+
+        return output_files
+
+    @beartype
+    def simulate(self, n_replicates: int, output_dir: Path, threads: int=1, chunk_size: int=16, name_template: str="{sentrix_id}_rep{i}.idat") -> list[Path]:
+        if 'i' not in [_[1] for _ in string.Formatter().parse(name_template)]:
+            raise Exception("Name template without {i}, every replicate would overwrite the same file: " + name_template)
+
+        os.makedirs(output_dir, exist_ok=True)
+
+        seeds = self.spawn_seeds(n_replicates)
+        chunks = [(list(range(_, min(_ + chunk_size, n_replicates))), seeds[_:_ + chunk_size]) for _ in range(0, n_replicates, chunk_size)]
+
+        output_files = []
+        if threads == 1:
+            for replicates, chunk_seeds in chunks:
+                output_files += self.write_replicates(replicates, chunk_seeds, output_dir, name_template)
+        else:
+            with ProcessPoolExecutor(max_workers=threads, initializer=_init_worker, initargs=(self,)) as executor:
+                for _ in executor.map(_write_replicates_worker, [_[0] for _ in chunks], [_[1] for _ in chunks], [output_dir] * len(chunks), [name_template] * len(chunks)):
+                    output_files += _
+
+        idattools.log.debug("Simulated " + str(n_replicates) + " replicates of: " + self.data.get_sentrix_id())
+
+        return output_files
+
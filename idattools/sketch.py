@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+# Compact per-array distribution sketches, so that cohort-wide outlier
+# screening does not have to re-read every per probe matrix. Per array:
+#
+#   intensity_quantiles -- percentiles 0..100 of probe_mean_intensities
+#   n_beads_hist        -- counts of every probe_n_beads value (0..255)
+#   cv_hist             -- histogram of probe_std_devs / probe_mean_intensities
+#   cv_max              -- largest std dev / intensity ratio (bounds the last bin)
+#
+# The sketches of a cohort are stored in one .npz file, together with the
+# size and modification time of every file, so that updates only parse new
+# or changed files. Sketches are cheap to compute from parsed arrays, so they
+# can also be built while parsing for something else (idat-tools qc).
+
+import idattools # log
+from .idat import IDATdata, IDATreader
+
+from pathlib import Path
+import os
+
+from beartype import beartype
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from numpy import ndarray
+
+
+
+sketch_quantiles = np.linspace(0, 1, 101)
+cv_edges = np.append(np.linspace(0, 1, 101), np.inf) # last bin: cv > 1
+
+
+@beartype
+def get_sketch_from_data(idat_data: IDATdata, idat_filename: Path) -> dict[str, ndarray]:
+    """Sketch of an array that is already parsed (from idat_filename)."""
+    per_probe_matrix = idat_data.per_probe_matrix
+
+    intensities = per_probe_matrix['probe_mean_intensities'].to_numpy()
+    std_devs = per_probe_matrix['probe_std_devs'].to_numpy()
+    n_beads = per_probe_matrix['probe_n_beads'].to_numpy()
+
+    nonzero = intensities > 0 # the cv of probes without intensity is undefined
+    cv = std_devs[nonzero].astype(np.float32) / intensities[nonzero]
+
+    stat = os.stat(idat_filename)
+    return {
+        'key': np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64),
+        'intensity_quantiles': np.quantile(intensities, sketch_quantiles).astype(np.float32),
+        'n_beads_hist': np.bincount(n_beads, minlength=256).astype(np.uint32),
+        'cv_hist': np.histogram(cv, bins=cv_edges)[0].astype(np.uint32),
+        'cv_max': np.float32(cv.max() if len(cv) > 0 else 0),
+    }
+
+
+@beartype
+def get_sketch(idat_filename: Path) -> dict[str, ndarray]:
+    """Sketch of one file; only the intensity, std dev and bead count sections are read."""
+    reader = IDATreader(idat_filename, load_per_probe_matrix=False)
+    reader.data.per_probe_matrix = next(reader.iter_chunks(reader.data.array_n_probes, ['probe_std_devs', 'probe_mean_intensities', 'probe_n_beads']))
+
+    return get_sketch_from_data(reader.data, idat_filename)
+
+
+class IDATsketches:
+    """Store of the sketches of a cohort, and queries on them."""
+
+    @beartype
+    def __init__(self, store_filename: Path):
+        self.store_filename = store_filename
+
+        self.names = np.array([], dtype=str)
+        self.keys = np.zeros((0, 2), dtype=np.int64)
+        self.intensity_quantiles = np.zeros((0, len(sketch_quantiles)), dtype=np.float32)
+        self.n_beads_hist = np.zeros((0, 256), dtype=np.uint32)
+        self.cv_hist = np.zeros((0, len(cv_edges) - 1), dtype=np.uint32)
+        self.cv_max = np.zeros(0, dtype=np.float32)
+
+        if os.path.exists(self.store_filename):
+            self.load()
+
+    def __len__(self):
+        return len(self.names)
+
+    @beartype
+    def load(self) -> int:
+        with np.load(self.store_filename, allow_pickle=False) as store:
+            if not np.array_equal(store['quantiles'], sketch_quantiles) or not np.array_equal(store['cv_edges'], cv_edges):
+                raise Exception("Sketches were made with different bins: " + str(self.store_filename))
+
+            self.names = store['names']
+            self.keys = store['keys']
+            self.intensity_quantiles = store['intensity_quantiles']
+            self.n_beads_hist = store['n_beads_hist']
+            self.cv_hist = store['cv_hist']
+            self.cv_max = store['cv_max']
+
+        return len(self.names)
+
+    @beartype
+    def write(self) -> Path:
+        tmp_filename = str(self.store_filename) + ".tmp.npz"
+        np.savez(tmp_filename,
+                 quantiles=sketch_quantiles,
+                 cv_edges=cv_edges,
+                 names=self.names,
+                 keys=self.keys,
+                 intensity_quantiles=self.intensity_quantiles,
+                 n_beads_hist=self.n_beads_hist,
+                 cv_hist=self.cv_hist,
+                 cv_max=self.cv_max)
+        os.replace(tmp_filename, self.store_filename) # atomic, readers never see a partial store
+
+        return self.store_filename
+
+    @beartype
+    def update(self, idat_filenames: list[Path], threads: int=1) -> int:
+        """Sketches new and changed files; sketches of other files are kept. Unreadable files are skipped. Returns the number of files sketched."""
+        index = {name: i for i, name in enumerate(self.names)}
+
+        todo = []
+        for idat_filename in idat_filenames:
+            stat = os.stat(idat_filename)
+            i = index.get(str(idat_filename))
+            if i is None or not np.array_equal(self.keys[i], [stat.st_size, stat.st_mtime_ns]):
+                todo.append(idat_filename)
+
+        idattools.log.info("Sketching " + str(len(todo)) + " files (" + str(len(idat_filenames) - len(todo)) + " up to date)")
+        if len(todo) == 0:
+            return 0
+
+        sketches = {}
+        with ProcessPoolExecutor(max_workers=threads) as executor:
+            futures = [executor.submit(get_sketch, _) for _ in todo]
+            for idat_filename, future in zip(todo, futures):
+                try:
+                    sketches[idat_filename] = future.result()
+                except Exception as e: # one corrupt file should not stop a cohort-wide update
+                    idattools.log.warning("Skipping " + str(idat_filename) + ": " + type(e).__name__ + ": " + str(e))
+
+        return self.add(sketches)
+
+    @beartype
+    def add(self, sketches: dict) -> int:
+        """Adds or replaces the sketches ({file: sketch}) and writes the store."""
+        if len(sketches) == 0:
+            return 0
+
+        index = {name: i for i, name in enumerate(self.names)}
+
+        names = list(self.names)
+        rows = {'key': list(self.keys), 'intensity_quantiles': list(self.intensity_quantiles), 'n_beads_hist': list(self.n_beads_hist), 'cv_hist': list(self.cv_hist), 'cv_max': list(self.cv_max)}
+        for idat_filename, sketch in sketches.items():
+            i = index.get(str(idat_filename))
+            if i is None:
+                index[str(idat_filename)] = len(names)
+                names.append(str(idat_filename))
+                for field in rows:
+                    rows[field].append(sketch[field])
+            else:
+                for field in rows:
+                    rows[field][i] = sketch[field]
+
+        self.names = np.array(names, dtype=str)
+        self.keys = np.array(rows['key'], dtype=np.int64)
+        self.intensity_quantiles = np.array(rows['intensity_quantiles'], dtype=np.float32)
+        self.n_beads_hist = np.array(rows['n_beads_hist'], dtype=np.uint32)
+        self.cv_hist = np.array(rows['cv_hist'], dtype=np.uint32)
+        self.cv_max = np.array(rows['cv_max'], dtype=np.float32)
+
+        self.write()
+
+        return len(sketches)
+
+    @beartype
+    def get_intensity_quantile(self, q: float) -> ndarray:
+        """Quantile q of the intensities of every array (interpolated between the stored percentiles)."""
+        return np.array([np.interp(q, sketch_quantiles, _) for _ in self.intensity_quantiles])
+
+    @beartype
+    def get_frac_low_beads(self, min_beads: int=3) -> ndarray:
+        return self.n_beads_hist[:, :min_beads].sum(axis=1) / self.n_beads_hist.sum(axis=1)
+
+    @beartype
+    def get_cv_quantile(self, q: float) -> ndarray:
+        """Quantile q of the std dev / intensity ratio of every array, at bin
+        resolution (0.01), and at most the largest ratio of the array (the
+        last bin is open-ended).
+        """
+        cumulative = np.cumsum(self.cv_hist, axis=1) / self.cv_hist.sum(axis=1, keepdims=True)
+        bins = np.argmax(cumulative >= q, axis=1)
+
+        return np.minimum(cv_edges[bins + 1], self.cv_max)
+
+    @beartype
+    def get_robust_z(self, values: ndarray) -> ndarray:
+        """(value - median) / (1.4826 * MAD) over the cohort."""
+        mad = 1.4826 * np.median(np.abs(values - np.median(values)))
+
+        return (values - np.median(values)) / mad if mad > 0 else np.zeros(len(values))
+
@@ -1,13 +1,19 @@
 #!/usr/bin/env python
 
 
+import collections
+import gzip
+import io
 import math
+import os
+import re
 import numpy as np
 from numpy import dtype
 
 from beartype import beartype
-from _io import BufferedReader
-from _io import BufferedWriter
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from io import IOBase # any binary file-like: files, pipes, BytesIO, tar members
 
 
 @beartype
@@ -39,7 +45,7 @@ def int_to_bytes(value: int, length: int) -> bytes:
 
 
 @beartype
-def read_byte(fh_in: BufferedReader) -> int:
+def read_byte(fh_in: IOBase) -> int:
     """Converts a single byte to an integer value.
 
     Arguments:
@@ -52,7 +58,7 @@ def read_byte(fh_in: BufferedReader) -> int:
 
 
 @beartype
-def read_short(fh_in: BufferedReader) -> int:
+def read_short(fh_in: IOBase) -> int:
     """Converts a two-byte element to an integer value.
 
     Arguments:
@@ -65,7 +71,7 @@ def read_short(fh_in: BufferedReader) -> int:
 
 
 @beartype
-def read_int(fh_in: BufferedReader) -> int:
+def read_int(fh_in: IOBase) -> int:
     """Converts a four-byte element to an integer value.
 
     Arguments:
@@ -78,7 +84,7 @@ def read_int(fh_in: BufferedReader) -> int:
 
 
 @beartype
-def read_long(fh_in: BufferedReader) -> int:
+def read_long(fh_in: IOBase) -> int:
     """Converts an eight-byte element to an integer value.
 
     Arguments:
@@ -91,7 +97,7 @@ def read_long(fh_in: BufferedReader) -> int:
 
 
 @beartype
-def read_char(fh_in: BufferedReader, num_bytes: int) -> str:
+def read_char(fh_in: IOBase, num_bytes: int) -> str:
     """Converts an array of bytes to a string.
 
     Arguments:
@@ -105,7 +111,7 @@ def read_char(fh_in: BufferedReader, num_bytes: int) -> str:
 
 
 @beartype
-def read_string(fh_in: BufferedReader) -> str:
+def read_string(fh_in: IOBase) -> str:
     """Converts an array of bytes to a string.
 
     Arguments:
@@ -129,7 +135,7 @@ def read_string(fh_in: BufferedReader) -> str:
 
 
 @beartype
-def read_numpy_vector(fh_in: BufferedReader, dtype: dtype, n_elements: int):
+def read_numpy_vector(fh_in: IOBase, dtype: dtype, n_elements: int):
     # https://stackoverflow.com/questions/72838939/how-to-convert-the-string-between-numpy-array-and-bytes
     """Parses a binary file multiple times, allowing for control if the
     file ends prematurely. This replaces read_results() and runs faster.
@@ -160,26 +166,25 @@ def read_numpy_vector(fh_in: BufferedReader, dtype: dtype, n_elements: int):
     return readdata
 
 
-def write_numpy_vector(fh_out: BufferedReader, np_data):
-    out_as_bytes = np.ndarray.tobytes(np_data)
-    
+@beartype
+def write_numpy_vector(fh_out: IOBase, np_data: np.ndarray) -> int:
     return fh_out.write(np_data)
 
 
 @beartype
-def write_char(fh_out: BufferedWriter, out: str) -> int:
+def write_char(fh_out: IOBase, out: str) -> int:
     return fh_out.write(str.encode(out))
 
 @beartype
-def write_short(fh_out: BufferedWriter, out: int) -> int:
+def write_short(fh_out: IOBase, out: int) -> int:
     return fh_out.write(int_to_bytes(out, 2))
 
 @beartype
-def write_int(fh_out: BufferedWriter, out: int) -> int:
+def write_int(fh_out: IOBase, out: int) -> int:
     return fh_out.write(int_to_bytes(out, 4))
 
 @beartype
-def write_long(fh_out: BufferedWriter, out: int) -> int:
+def write_long(fh_out: IOBase, out: int) -> int:
     return fh_out.write(int_to_bytes(out, 8))
 
 
@@ -197,7 +202,7 @@ def binary_string_len(string: str) -> int:
     ...
     """
     
-    l = len(string)
+    l = len(str.encode(string)) # in bytes, not characters
     l_enc = long_to_7bit_string(l)
     
     return len(l_enc) + l
@@ -228,8 +233,159 @@ def long_to_7bit_string(var_sized_integer: int) -> bytearray:
 
 
 @beartype
-def write_string(fh_out: BufferedWriter, out: str):
-    return fh_out.write(long_to_7bit_string(len(out)) + str.encode(out))
+def write_string(fh_out: IOBase, out: str):
+    out = str.encode(out)
+    return fh_out.write(long_to_7bit_string(len(out)) + out)
+
+
+
+
+@beartype
+def pair_red_green(idat_filenames: list[str]) -> dict[str, tuple[str, str]]:
+    """Pairs files by the Illumina naming convention:
+    <sample>_Grn.idat and <sample>_Red.idat -> {<sample>: (grn, red)}
+    """
+    pairs = {}
+
+    for idat_filename in idat_filenames:
+        match = re.match(r"^(.+)_(Grn|Red)\.idat(\.gz)?$", os.path.basename(idat_filename))
+        if not match:
+            raise Exception("File name does not end with _Grn.idat or _Red.idat: " + idat_filename)
+
+        pair = pairs.setdefault(match.group(1), {})
+        if match.group(2) in pair:
+            raise Exception("Duplicate " + match.group(2) + " file for sample: " + match.group(1))
+        pair[match.group(2)] = idat_filename
+
+    for sample, pair in pairs.items():
+        if len(pair) != 2:
+            raise Exception("Incomplete Grn/Red pair for sample: " + sample)
+
+    return {sample: (pair['Grn'], pair['Red']) for sample, pair in pairs.items()}
+
+
+@beartype
+def pread_into(fd: int, buffer: memoryview, offset: int) -> int:
+    """Positional read (no shared file position, so safe across threads) that
+    fills the entire buffer, or raises EOFError if the file ends before.
+    """
+    n_read = 0
+
+    while n_read < len(buffer):
+        data = os.pread(fd, len(buffer) - n_read, offset + n_read)
+        if len(data) == 0:
+            raise EOFError('End of file reached before number of results parsed')
+
+        buffer[n_read:n_read + len(data)] = data
+        n_read += len(data)
 
+    return n_read
 
 
+class ParallelGzipWriter(io.BufferedIOBase):
+    """Write-only file-like that compresses blocks of block_size bytes in a
+    thread pool (zlib releases the GIL) and writes them, in order, as
+    concatenated gzip members - which is standard gzip, readable by gzip,
+    zcat and python's gzip module.
+    """
+
+    def __init__(self, fh_out, compresslevel: int=6, threads: Optional[int]=None, block_size: int=1024 * 1024):
+        if compresslevel < 0 or compresslevel > 9:
+            raise Exception("Invalid compression level: " + str(compresslevel))
+
+        self.fh_out = fh_out
+        self.compresslevel = compresslevel
+        self.block_size = block_size
+
+        self.threads = threads if threads is not None else (os.cpu_count() or 1)
+        self.executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="gzip")
+        self.pending = collections.deque() # compressed blocks, bounded to limit memory
+        self.buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def _submit(self, block: bytes):
+        self.pending.append(self.executor.submit(gzip.compress, block, self.compresslevel, mtime=0))
+
+        while len(self.pending) > 2 * self.threads:
+            self.fh_out.write(self.pending.popleft().result())
+
+    def write(self, data) -> int:
+        data = memoryview(data).cast('B')
+        pos = 0
+
+        if len(self.buffer) > 0:
+            pos = min(self.block_size - len(self.buffer), len(data))
+            self.buffer += data[:pos]
+            if len(self.buffer) == self.block_size:
+                self._submit(bytes(self.buffer))
+                self.buffer = bytearray()
+
+        while len(data) - pos >= self.block_size:
+            self._submit(bytes(data[pos:pos + self.block_size]))
+            pos += self.block_size
+
+        self.buffer += data[pos:]
+
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            if len(self.buffer) > 0:
+                self._submit(bytes(self.buffer))
+                self.buffer = bytearray()
+
+            while len(self.pending) > 0:
+                self.fh_out.write(self.pending.popleft().result())
+
+            self.executor.shutdown()
+            self.fh_out.flush()
+
+        super().close()
+
+
+@beartype
+def copy_range(src_filename, fh_out: IOBase, offset: int, size: int) -> int:
+    """Copies size bytes at offset of src_filename to the current position of
+    fh_out. When fh_out is a file (or pipe), the copy is done kernel-side
+    with os.copy_file_range or os.sendfile, otherwise through userland.
+    """
+    copied = 0
+
+    with open(src_filename, "rb") as fh_in:
+        try:
+            fd_out = fh_out.fileno()
+        except (OSError, io.UnsupportedOperation): # BytesIO, compressed streams
+            fd_out = None
+
+        if fd_out is not None:
+            fh_out.flush()
+
+            for method in ['copy_file_range', 'sendfile']:
+                try:
+                    while copied < size:
+                        if method == 'copy_file_range':
+                            n = os.copy_file_range(fh_in.fileno(), fd_out, size - copied, offset + copied)
+                        else:
+                            n = os.sendfile(fd_out, fh_in.fileno(), offset + copied, size - copied)
+
+                        if n == 0:
+                            raise EOFError('End of file reached before section was copied')
+                        copied += n
+                    break
+                except (AttributeError, OSError): # not available on platform or file system
+                    continue
+
+            if fh_out.seekable():
+                fh_out.seek(0, os.SEEK_END) # sync the buffered position with the file descriptor
+
+        fh_in.seek(offset + copied)
+        while copied < size:
+            data = fh_in.read(min(size - copied, 1024 * 1024))
+            if len(data) == 0:
+                raise EOFError('End of file reached before section was copied')
+            copied += fh_out.write(data)
+
+    return copied
+
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+# Synthetic IDAT files, so that the tests do not depend on (large) real arrays.
+
+from idattools.idat import IDATdata, IDATwriter
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+
+section_order = ['ARRAY_N_PROBES', 'PROBE_IDS', 'PROBE_STD_DEVS', 'PROBE_MEAN_INTENSITIES', 'PROBE_N_BEADS', 'PROBE_MID_BLOCK',
+                 'ARRAY_RUN_INFO', 'ARRAY_RED_GREEN', 'ARRAY_MANIFEST', 'ARRAY_BARCODE', 'ARRAY_CHIP_TYPE', 'ARRAY_CHIP_LABEL',
+                 'ARRAY_OLD_STYLE_MANIFEST', 'ARRAY_UNKNOWN_1', 'ARRAY_SAMPLE_ID', 'ARRAY_DESCRIPTION', 'ARRAY_PLATE', 'ARRAY_WELL',
+                 'ARRAY_UNKNOWN_2']
+
+
+def make_idat_data(n_probes: int=1000, seed: int=0, barcode: str="203927450093") -> IDATdata:
+    rng = np.random.default_rng(seed)
+    probe_ids = (np.cumsum(np.random.default_rng(42).integers(1, 20, n_probes)) + 1600000).astype('<u4')
+
+    idat_data = IDATdata()
+    idat_data.set_file_magic("IDAT")
+    idat_data.set_idat_version(3)
+    idat_data.set_section_index_order(section_order[::-1])
+    idat_data.set_section_physical_order(section_order)
+    idat_data.set_array_n_probes(n_probes)
+    idat_data.set_per_probe_matrix(pd.DataFrame({
+        'probe_ids': probe_ids,
+        'probe_std_devs': rng.integers(0, 2000, n_probes).astype('<u2'),
+        'probe_mean_intensities': rng.integers(0, 20000, n_probes).astype('<u2'),
+        'probe_n_beads': rng.integers(0, 30, n_probes).astype('<u1'),
+        'probe_mid_block': probe_ids.copy()}))
+    idat_data.set_array_red_green(0)
+    idat_data.set_array_manifest("")
+    idat_data.set_array_barcode(barcode)
+    idat_data.set_array_chip_type("BeadChip 8x5")
+    idat_data.set_array_chip_label("R01C01")
+    idat_data.set_array_old_style_manifest("")
+    idat_data.set_array_unknown_1((1, 0, 0, 0))
+    idat_data.set_array_sample_id("")
+    idat_data.set_array_description("")
+    idat_data.set_array_plate("")
+    idat_data.set_array_well("")
+    idat_data.set_array_unknown_2("")
+    idat_data.set_array_run_info([("8/21/2019 3:16:12 PM", "Decoding", "CallsToUsed=2798107", "AutoDecode", "2.6.2"),
+                                  ("6/5/2020 2:44:03 PM", "Scan", "ScannerID=N1065", "iScan Control Software", "3.4.8")])
+
+    return idat_data
+
+
+@pytest.fixture
+def idat_file(tmp_path) -> Path:
+    idat_filename = tmp_path / "203927450093_R01C01_Grn.idat"
+    IDATwriter(make_idat_data()).write(idat_filename)
+
+    return idat_filename
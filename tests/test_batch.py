@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+
+from idattools.batch import IDATbatchmixer
+from idattools.idat import IDATwriter
+
+from conftest import make_idat_data
+
+import pytest
+
+
+
+def test_mix_batch_failure_and_resume(tmp_path):
+    for seed in range(3):
+        IDATwriter(make_idat_data(seed=seed)).write(tmp_path / ("20392745009" + str(seed) + "_R01C01_Grn.idat"))
+
+    outputs = [str(tmp_path / ("20392745010" + str(_) + "_R01C01_Grn.idat")) for _ in range(4)]
+    outputs[2] = str(tmp_path / "missing_dir" / "203927450102_R01C01_Grn.idat") # fails
+    with open(tmp_path / "plan.csv", "w") as fh_out:
+        fh_out.write("reference,mixed_in,ratio,output\n")
+        for i, output in enumerate(outputs):
+            fh_out.write(str(tmp_path / "203927450090_R01C01_Grn.idat") + "," + str(tmp_path / ("20392745009" + str(1 + i % 2) + "_R01C01_Grn.idat")) + ",0.5," + output + "\n")
+
+    with open(tmp_path / "plan.csv.done", "w") as fh_out:
+        fh_out.write(outputs[0][:-3]) # interrupted write
+
+    mixer = IDATbatchmixer(tmp_path / "plan.csv", threads=2)
+    with pytest.raises(Exception, match="1 of 4 rows failed"):
+        mixer.run()
+
+    assert mixer.get_done() == {outputs[0], outputs[1], outputs[3]}
+
+    (tmp_path / "missing_dir").mkdir()
+    assert mixer.run() == 1
+    assert mixer.get_done() == set(outputs)
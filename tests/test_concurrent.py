@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+
+from idattools.idat import IDATreader, IDATwriter
+
+from conftest import make_idat_data
+
+import pytest
+
+
+
+def test_concurrent_read(tmp_path):
+    idat_filename = tmp_path / "203927450093_R01C01_Grn.idat"
+    IDATwriter(make_idat_data(n_probes=50000)).write(idat_filename)
+
+    expected = IDATreader(idat_filename).data.per_probe_matrix
+    for threads in [2, 4]:
+        reader = IDATreader(idat_filename, threads=threads)
+        assert reader.parse_per_probe_matrix_concurrent(reader.section_seek_index, threads, block_size=4096).equals(expected) # many small blocks
+
+        assert IDATreader(idat_filename, threads=threads).data.per_probe_matrix.equals(expected)
+
+
+def test_concurrent_read_truncated(tmp_path):
+    idat_filename = tmp_path / "203927450093_R01C01_Grn.idat"
+    IDATwriter(make_idat_data(n_probes=50000)).write(idat_filename)
+    idat_filename.write_bytes(idat_filename.read_bytes()[:300000]) # within the probe sections
+
+    with pytest.raises(Exception):
+        IDATreader(idat_filename, threads=4)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+from idattools.correlate import IDATcorrelator
+from idattools.idat import IDATwriter
+
+from conftest import make_idat_data
+
+import numpy as np
+import pytest
+
+
+
+def write_sample(idat_filename, seed, intensities=None):
+    idat_data = make_idat_data(seed=seed)
+    if intensities is not None:
+        per_probe_matrix = idat_data.per_probe_matrix.copy()
+        per_probe_matrix['probe_mean_intensities'] = intensities
+        idat_data.set_per_probe_matrix(per_probe_matrix)
+    IDATwriter(idat_data).write(idat_filename)
+
+    return np.log2(idat_data.per_probe_matrix['probe_mean_intensities'].to_numpy() + 1.0)
+
+
+def test_correlate(tmp_path):
+    rng = np.random.default_rng(0)
+    duplicate = make_idat_data(seed=0).per_probe_matrix['probe_mean_intensities'].to_numpy()
+    duplicate = (duplicate + rng.integers(0, 3, len(duplicate))).astype('<u2') # e.g. a re-scan
+
+    idat_filenames = [tmp_path / ("s" + str(_) + ".idat") for _ in range(5)]
+    values = [write_sample(idat_filenames[_], _) for _ in range(4)] + [write_sample(idat_filenames[4], 9, duplicate)]
+
+    expected = np.corrcoef(np.array(values))
+    pairs = IDATcorrelator(idat_filenames, paired=False, tmp_dir=tmp_path, block_size=2).get_top_pairs(threshold=-1.0)
+
+    assert len(pairs) == 5 * 4 // 2
+    assert [_[2] for _ in pairs] == sorted([_[2] for _ in pairs], reverse=True)
+    for sample_a, sample_b, correlation in pairs:
+        assert correlation == pytest.approx(expected[idat_filenames.index(tmp_path / sample_a), idat_filenames.index(tmp_path / sample_b)], abs=1e-5)
+
+    top = IDATcorrelator(idat_filenames, paired=False, block_size=2).get_top_pairs(threshold=0.99)
+    assert [(_[0], _[1]) for _ in top] == [(str(idat_filenames[0]), str(idat_filenames[4]))]
+
+
+def test_correlate_paired(tmp_path):
+    idat_filenames = []
+    for sample, seeds in [("a", (0, 1)), ("b", (2, 3)), ("c", (0, 1))]:
+        for channel, seed in zip(["Grn", "Red"], seeds):
+            idat_filenames.append(tmp_path / (sample + "_" + channel + ".idat"))
+            write_sample(idat_filenames[-1], seed)
+
+    pairs = IDATcorrelator(idat_filenames).get_top_pairs(threshold=0.99)
+    assert [(_[0], _[1]) for _ in pairs] == [("a", "c")]
+    assert pairs[0][2] == pytest.approx(1.0, abs=1e-5)
+
+    with pytest.raises(Exception, match="Incomplete Grn/Red pair"):
+        IDATcorrelator(idat_filenames[:-1])
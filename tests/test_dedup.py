@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+from idattools.fingerprint import IDATdedup
+import idattools.fingerprint
+from idattools.idat import IDATwriter
+
+from conftest import make_idat_data
+
+import pytest
+
+
+
+@pytest.fixture
+def idat_files(tmp_path):
+    idat_files = [tmp_path / _ for _ in ["a_Grn.idat", "b_Grn.idat.gz", "c_Grn.idat", "d_Grn.idat", "corrupt_Grn.idat"]]
+
+    IDATwriter(make_idat_data(seed=0)).write(idat_files[0])
+    IDATwriter(make_idat_data(seed=0)).write(idat_files[1]) # compressed copy
+    reupload = make_idat_data(seed=0)
+    reupload.set_array_sample_id("reupload")
+    IDATwriter(reupload).write(idat_files[2]) # differs outside the probe sections
+    IDATwriter(make_idat_data(seed=1)).write(idat_files[3])
+    idat_files[4].write_bytes(idat_files[0].read_bytes()[:2000]) # truncated
+
+    return idat_files
+
+
+def test_dedup(idat_files):
+    duplicates = IDATdedup(idat_files, threads=2).get_duplicates()
+
+    assert [sorted(_) for _ in duplicates.values()] == [sorted(idat_files[:3])]
+
+
+def test_dedup_cache(idat_files, tmp_path, monkeypatch):
+    cache_filename = tmp_path / "fingerprints.tsv"
+    expected = IDATdedup(idat_files, cache_filename=cache_filename).get_duplicates()
+    assert len(cache_filename.read_text().splitlines()) == 1 + 4 # the corrupt file is not cached
+
+    hashed = []
+    get_section_fingerprints = idattools.fingerprint.get_section_fingerprints
+    monkeypatch.setattr(idattools.fingerprint, "get_section_fingerprints", lambda _: hashed.append(_) or get_section_fingerprints(_))
+
+    IDATwriter(make_idat_data(n_probes=999)).write(idat_files[3]) # changed (size) since cached
+    assert IDATdedup(idat_files, cache_filename=cache_filename).get_duplicates() == expected
+    assert sorted(hashed) == sorted([idat_files[3], idat_files[4]])
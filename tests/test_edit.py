@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+from idattools.edit import IDATeditor
+from idattools.idat import IDATreader, IDATwriter
+
+from conftest import make_idat_data
+
+import os
+
+import numpy as np
+import pytest
+
+
+
+def test_edit(idat_file, tmp_path):
+    original = idat_file.read_bytes()
+    idat_r = IDATreader(idat_file)
+    per_probe_matrix = idat_r.data.per_probe_matrix
+    masked = per_probe_matrix['probe_ids'].to_numpy()[[3, 500]]
+
+    with IDATeditor(idat_file, tmp_path / "edited.idat") as editor:
+        editor.scale(0.5, chunk_probes=300)
+        assert editor.mask(np.append(masked, np.uint32(1))) == 2 # 1 is not on the array
+        editor.mask_low_beads(5, columns=['probe_n_beads'], value=1)
+
+    assert idat_file.read_bytes() == original
+
+    expected = per_probe_matrix.copy()
+    for column in ['probe_mean_intensities', 'probe_std_devs']:
+        expected[column] = np.round(expected[column].to_numpy() * 0.5).astype(expected[column].dtype)
+    expected.loc[[3, 500], ['probe_std_devs', 'probe_mean_intensities', 'probe_n_beads']] = 0
+    expected.loc[expected['probe_n_beads'] < 5, 'probe_n_beads'] = 1
+
+    idat_e = IDATreader(tmp_path / "edited.idat")
+    assert idat_e.data.per_probe_matrix.equals(expected)
+
+    # only the edited probe sections differ
+    edited = (tmp_path / "edited.idat").read_bytes()
+    assert len(edited) == len(original)
+    for section, (offset, size) in idat_r.get_section_ranges().items():
+        if section not in ['PROBE_STD_DEVS', 'PROBE_MEAN_INTENSITIES', 'PROBE_N_BEADS']:
+            assert edited[offset:offset + size] == original[offset:offset + size]
+
+
+def test_edit_in_place(idat_file):
+    expected = IDATreader(idat_file).data.per_probe_matrix['probe_mean_intensities'].to_numpy()
+
+    with IDATeditor(idat_file) as editor:
+        editor.scale(2.0, columns=['probe_mean_intensities'])
+
+    assert np.array_equal(IDATreader(idat_file).data.per_probe_matrix['probe_mean_intensities'].to_numpy(), np.clip(expected * 2, 0, 65535))
+
+
+def test_edit_refuses(idat_file, tmp_path):
+    original = idat_file.read_bytes()
+
+    with pytest.raises(Exception, match="same file"):
+        IDATeditor(idat_file, idat_file)
+    os.link(idat_file, tmp_path / "link.idat")
+    with pytest.raises(Exception, match="same file"):
+        IDATeditor(idat_file, tmp_path / "link.idat")
+    assert idat_file.read_bytes() == original
+
+    IDATwriter(make_idat_data()).write(tmp_path / "a.idat.gz")
+    with pytest.raises(Exception, match="Compressed files"):
+        IDATeditor(tmp_path / "a.idat.gz", tmp_path / "b.idat")
+
+    with IDATeditor(idat_file, tmp_path / "edited.idat") as editor:
+        with pytest.raises(Exception, match="can not be edited"):
+            editor.scale(2.0, columns=['probe_ids'])
+        with pytest.raises(Exception, match="Invalid scaling factor"):
+            editor.scale(-1.0)
+
+    (tmp_path / "truncated.idat").write_bytes(original[:3000])
+    with pytest.raises(Exception, match="Truncated file"):
+        IDATeditor(tmp_path / "truncated.idat")
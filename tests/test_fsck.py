@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+from idattools.fsck import check_idat
+from idattools.idat import IDATwriter
+
+from conftest import make_idat_data, section_order
+
+import gzip
+import os
+
+import pytest
+
+
+
+def test_fsck_ok(idat_file):
+    assert check_idat(idat_file) == []
+    assert check_idat(idat_file, deep=True) == []
+
+
+@pytest.mark.parametrize("n_bytes", [1, 6, 40, 1000])
+def test_fsck_truncated(idat_file, n_bytes):
+    # 1, 6 and 40 bytes end inside the trailing string and run info sections
+    os.truncate(idat_file, os.path.getsize(idat_file) - n_bytes)
+
+    problems = check_idat(idat_file)
+    assert len(problems) > 0
+    assert "Truncated" in problems[0]
+
+
+@pytest.mark.parametrize("n_bytes", [1, 6, 20])
+def test_fsck_truncated_run_info(tmp_path, n_bytes):
+    # the run info strings are the last section, the file ends inside them
+    idat_data = make_idat_data()
+    idat_data.set_section_physical_order([_ for _ in section_order if _ != 'ARRAY_RUN_INFO'] + ['ARRAY_RUN_INFO'])
+    idat_filename = tmp_path / "203927450093_R01C01_Grn.idat"
+    IDATwriter(idat_data).write(idat_filename)
+    assert check_idat(idat_filename) == []
+
+    os.truncate(idat_filename, os.path.getsize(idat_filename) - n_bytes)
+
+    problems = check_idat(idat_filename)
+    assert len(problems) > 0
+    assert "Truncated" in problems[0]
+
+
+def test_fsck_truncated_gz(idat_file):
+    with open(idat_file, "rb") as fh_in:
+        data = fh_in.read()
+    with gzip.open(str(idat_file) + ".gz", "wb") as fh_out:
+        fh_out.write(data[:-6])
+
+    assert len(check_idat(idat_file.with_name(idat_file.name + ".gz"))) > 0
+
+
+def test_fsck_trailing_data(idat_file):
+    with open(idat_file, "ab") as fh_out:
+        fh_out.write(b"\0")
+
+    assert check_idat(idat_file)[0].startswith("Trailing data")
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+
+from idattools.idat import IDATreader, IDATwriter
+from idattools.utils import ParallelGzipWriter
+
+from conftest import make_idat_data
+
+import gzip
+import io
+
+import numpy as np
+import pytest
+
+
+
+@pytest.mark.parametrize("compress_threads", [1, 3])
+def test_write_read_gzip(tmp_path, compress_threads):
+    idat_data = make_idat_data(n_probes=100000)
+    IDATwriter(idat_data).write(tmp_path / "a.idat")
+    IDATwriter(idat_data).write(tmp_path / "a.idat.gz", chunk_probes=10000, compress_level=1, compress_threads=compress_threads)
+
+    assert gzip.decompress((tmp_path / "a.idat.gz").read_bytes()) == (tmp_path / "a.idat").read_bytes()
+    assert IDATreader(tmp_path / "a.idat.gz").data.per_probe_matrix.equals(idat_data.per_probe_matrix)
+    assert IDATreader(tmp_path / "a.idat.gz", load_per_probe_matrix=False).data.get_per_probe_matrix().equals(idat_data.per_probe_matrix)
+
+
+def test_parallel_gzip_writer():
+    data = np.random.default_rng(0).integers(0, 4, 100000, dtype=np.uint8).tobytes()
+
+    fh_out = io.BytesIO()
+    with ParallelGzipWriter(fh_out, compresslevel=9, threads=2, block_size=1000) as fh:
+        for start in range(0, len(data), 777): # writes that straddle the blocks
+            fh.write(data[start:start + 777])
+
+    assert gzip.decompress(fh_out.getvalue()) == data
+
+    with pytest.raises(Exception, match="Invalid compression level"):
+        ParallelGzipWriter(io.BytesIO(), compresslevel=10)
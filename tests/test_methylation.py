@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+from idattools.idat import IDATwriter
+from idattools.manifest import IDATmanifest
+from idattools.methylation import IDATmethylation
+
+from conftest import make_idat_data
+
+import os
+
+import numpy as np
+import pytest
+
+
+
+@pytest.fixture
+def pair(tmp_path):
+    grn_file, red_file = tmp_path / "203927450093_R01C01_Grn.idat", tmp_path / "203927450093_R01C01_Red.idat"
+    IDATwriter(make_idat_data(seed=0)).write(grn_file)
+    IDATwriter(make_idat_data(seed=1)).write(red_file)
+
+    return grn_file, red_file
+
+
+@pytest.fixture
+def manifest_file(tmp_path):
+    probe_ids = make_idat_data().per_probe_matrix['probe_ids'].to_numpy()
+
+    manifest_filename = tmp_path / "manifest.csv"
+    manifest_filename.write_text("Illumina, Inc.\n"
+                                 "[Heading]\n"
+                                 "Descriptor File Name,test\n"
+                                 "[Assay]\n"
+                                 "IlmnID,Name,AddressA_ID,AddressB_ID,Infinium_Design_Type,Color_Channel\n"
+                                 "cg1,cg1," + str(probe_ids[0]) + ",,II,\n"
+                                 "cg2,cg2," + str(probe_ids[1]) + "," + str(probe_ids[2]) + ",I,Red\n"
+                                 "cg3,cg3," + str(probe_ids[3]) + "," + str(probe_ids[4]) + ",I,Grn\n"
+                                 "cg4,cg4,1,,II,\n" # not on the array
+                                 "[Controls]\n"
+                                 "28684356,STAINING,Biotin (High),Blue\n")
+
+    return manifest_filename
+
+
+def test_manifest(manifest_file):
+    manifest = IDATmanifest(manifest_file)
+
+    assert manifest.names.tolist() == ["cg1", "cg2", "cg3", "cg4"]
+    assert manifest.design_type.tolist() == [2, 1, 1, 2]
+    assert manifest.color_channel.tolist() == [0, 1, 2, 0]
+    assert manifest.address_b[0] == 0
+    assert os.path.exists(str(manifest_file) + ".idx.npz")
+
+    cached = IDATmanifest(manifest_file)
+    assert np.array_equal(cached.address_a, manifest.address_a)
+
+
+def test_manifest_rebuilds_stale_cache(manifest_file):
+    IDATmanifest(manifest_file)
+    manifest_file.write_text(manifest_file.read_text().replace("cg4,cg4,1,,II,\n", ""))
+
+    assert len(IDATmanifest(manifest_file)) == 3
+
+
+def test_beta_values(manifest_file, pair):
+    grn_file, red_file = pair
+    grn = make_idat_data(seed=0).per_probe_matrix['probe_mean_intensities'].to_numpy(np.float64)
+    red = make_idat_data(seed=1).per_probe_matrix['probe_mean_intensities'].to_numpy(np.float64)
+
+    methylated = np.array([grn[0], red[2], grn[4]])
+    unmethylated = np.array([red[0], red[1], grn[3]])
+
+    matrix = IDATmethylation(IDATmanifest(manifest_file), offset=100.0).get_matrix({'sample': pair})
+    assert matrix.index.tolist() == ["cg1", "cg2", "cg3", "cg4"]
+    assert np.allclose(matrix['sample'].to_numpy()[:3], methylated / (methylated + unmethylated + 100.0))
+    assert np.isnan(matrix['sample'].iloc[3])
+
+    matrix = IDATmethylation(IDATmanifest(manifest_file), alpha=1.0).get_matrix({'sample': pair}, m_values=True, io_threads=2)
+    assert np.allclose(matrix['sample'].to_numpy()[:3], np.log2((methylated + 1.0) / (unmethylated + 1.0)))
+
+
+def test_beta_values_different_probe_ids(manifest_file, tmp_path):
+    grn_file, red_file = tmp_path / "a_Grn.idat", tmp_path / "a_Red.idat"
+    IDATwriter(make_idat_data(n_probes=1000)).write(grn_file)
+    IDATwriter(make_idat_data(n_probes=999)).write(red_file)
+
+    with pytest.raises(Exception, match="different probe_ids"):
+        IDATmethylation(IDATmanifest(manifest_file)).get_matrix({'sample': (grn_file, red_file)})
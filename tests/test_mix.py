@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+from idattools.idat import IDATmixer, IDATreader, IDATwriter
+
+from conftest import make_idat_data
+
+from pathlib import Path
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+
+idat_tools = [sys.executable, str(Path(__file__).parent.parent / "bin" / "idat-tools")]
+env = dict(os.environ, PYTHONPATH=str(Path(__file__).parent.parent))
+
+
+def test_mix(idat_file, tmp_path):
+    idat_ref = IDATreader(idat_file).data
+    idat_mix = make_idat_data(seed=1)
+
+    mixed = IDATmixer(idat_ref).mix(idat_mix, 0.25, tmp_path / "203927450094_R01C01_Grn.idat")
+    expected = np.round(idat_ref.per_probe_matrix['probe_mean_intensities'].to_numpy() * 0.75 + idat_mix.per_probe_matrix['probe_mean_intensities'].to_numpy() * 0.25)
+
+    assert mixed.per_probe_matrix is not None
+    assert np.array_equal(mixed.per_probe_matrix['probe_mean_intensities'].to_numpy(), expected)
+    assert np.array_equal(IDATreader(tmp_path / "203927450094_R01C01_Grn.idat").data.per_probe_matrix['probe_mean_intensities'].to_numpy(), expected)
+
+
+@pytest.mark.parametrize("chunk_probes", [None, 100])
+def test_mix_different_probe_ids(idat_file, tmp_path, chunk_probes):
+    idat_mix = make_idat_data(seed=1)
+    per_probe_matrix = idat_mix.per_probe_matrix.copy()
+    per_probe_matrix['probe_ids'] = per_probe_matrix['probe_mid_block'] = per_probe_matrix['probe_ids'].to_numpy() + np.uint32(1)
+    idat_mix.set_per_probe_matrix(per_probe_matrix)
+
+    output_filename = tmp_path / "203927450094_R01C01_Grn.idat"
+    with pytest.raises(Exception, match="different probe_ids"):
+        IDATmixer(IDATreader(idat_file, load_per_probe_matrix=False).data).mix(idat_mix, 0.5, output_filename, chunk_probes=chunk_probes)
+
+    assert not output_filename.exists()
+
+
+@pytest.mark.parametrize("chunk_probes", [None, 100])
+def test_mix_refuses_input_as_output(idat_file, tmp_path, chunk_probes):
+    mixed_in_filename = tmp_path / "203927450094_R01C01_Grn.idat"
+    IDATwriter(make_idat_data(seed=1)).write(mixed_in_filename)
+    data = idat_file.read_bytes()
+
+    for output_filename in [idat_file, mixed_in_filename]:
+        idat_ref = IDATreader(idat_file, load_per_probe_matrix=False).data
+        idat_mix = IDATreader(mixed_in_filename, load_per_probe_matrix=False).data
+        with pytest.raises(Exception, match="same file as an input"):
+            IDATmixer(idat_ref).mix(idat_mix, 0.5, output_filename, chunk_probes=chunk_probes)
+
+    assert idat_file.read_bytes() == data
+
+
+def test_cli_mix_refuses_input_as_output(idat_file, tmp_path):
+    mixed_in_filename = tmp_path / "203927450094_R01C01_Grn.idat.gz"
+    IDATwriter(make_idat_data(seed=1)).write(mixed_in_filename)
+    data = mixed_in_filename.read_bytes()
+
+    for args in [[idat_file, mixed_in_filename, idat_file], [idat_file, mixed_in_filename, mixed_in_filename]]:
+        mix = subprocess.run(idat_tools + ["mix"] + [str(_) for _ in args], capture_output=True, env=env)
+        assert mix.returncode != 0
+        assert b"same file as an input" in mix.stderr
+
+    assert mixed_in_filename.read_bytes() == data
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+from idattools.idat import IDATreader, IDATwriter
+from idattools.normalize import IDATnormalizer
+
+from conftest import make_idat_data
+
+import numpy as np
+
+
+
+def test_normalize(tmp_path):
+    idat_files = []
+    for seed in range(4):
+        idat_files.append(tmp_path / ("20392745009" + str(seed) + "_R01C01_Grn.idat"))
+        IDATwriter(make_idat_data(seed=seed)).write(idat_files[-1])
+
+    output_files = IDATnormalizer(idat_files, threads=2, chunk_size=3).normalize(tmp_path / "normalized")
+
+    # in memory: every sample gets the mean of the sorted intensities, by rank
+    intensities = np.array([IDATreader(_).data.per_probe_matrix['probe_mean_intensities'].to_numpy() for _ in idat_files])
+    reference = np.round(np.sort(intensities, axis=1).mean(axis=0)).astype('<u2')
+
+    for i, output_file in enumerate(output_files):
+        expected = np.empty(intensities.shape[1], dtype='<u2')
+        expected[np.argsort(intensities[i], kind='stable')] = reference
+
+        idat_data = IDATreader(output_file).data
+        assert np.array_equal(idat_data.per_probe_matrix['probe_mean_intensities'].to_numpy(), expected)
+        assert np.array_equal(idat_data.per_probe_matrix['probe_std_devs'].to_numpy(), IDATreader(idat_files[i]).data.per_probe_matrix['probe_std_devs'].to_numpy())
+
+
+def test_normalize_reads_only_needed_sections(tmp_path, monkeypatch):
+    idat_files = []
+    for seed in range(3):
+        idat_files.append(tmp_path / ("20392745009" + str(seed) + "_R01C01_Grn.idat"))
+        IDATwriter(make_idat_data(seed=seed)).write(idat_files[-1])
+
+    # entire per probe matrices are only parsed in the final pass, once per file
+    n_parsed = []
+    parse_per_probe_matrix = IDATreader.parse_per_probe_matrix
+    def counting_parse(self, *args, **kwargs):
+        n_parsed.append(self.idat_filename)
+        return parse_per_probe_matrix(self, *args, **kwargs)
+    monkeypatch.setattr(IDATreader, 'parse_per_probe_matrix', counting_parse)
+
+    IDATnormalizer(idat_files).normalize(tmp_path / "normalized")
+
+    assert sorted(n_parsed) == sorted(idat_files)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+from idattools.idat import IDATreader, IDATwriter
+from idattools.pack import IDATpack
+
+from conftest import make_idat_data
+
+import pytest
+
+
+
+def test_pack_roundtrip(tmp_path):
+    pack_filename = tmp_path / "samples.idatpack"
+    originals = []
+    for i in range(3):
+        originals.append(tmp_path / ("20392745009" + str(i) + "_R01C01_Grn.idat"))
+        IDATwriter(make_idat_data(seed=i, barcode="20392745009" + str(i))).write(originals[-1])
+
+        assert IDATpack(pack_filename).append(IDATreader(originals[-1]).data, originals[-1].name) == i # reopened for every append
+
+    pack = IDATpack(pack_filename)
+    assert len(pack) == 3
+    assert pack.get_index("203927450091_R01C01") == pack.get_index("203927450091_R01C01_Grn.idat") == 1
+
+    for i, original in enumerate(originals):
+        pack.export(i, tmp_path / ("export_" + str(i) + ".idat"))
+        assert (tmp_path / ("export_" + str(i) + ".idat")).read_bytes() == original.read_bytes()
+
+    with pytest.raises(Exception, match="Sample not found"):
+        pack.get("unknown")
+    with pytest.raises(Exception, match="Sample out of range"):
+        pack.get(3)
+
+
+def test_pack_different_probe_ids(tmp_path):
+    pack = IDATpack(tmp_path / "samples.idatpack")
+    pack.append(make_idat_data(n_probes=1000))
+
+    with pytest.raises(Exception, match="differ from the probe ids"):
+        pack.append(make_idat_data(n_probes=999))
+
+
+def test_pack_incomplete_record(tmp_path):
+    pack_filename = tmp_path / "samples.idatpack"
+    pack = IDATpack(pack_filename)
+    for i in range(2):
+        pack.append(make_idat_data(seed=i))
+    size = pack_filename.stat().st_size
+
+    pack_filename.write_bytes(pack_filename.read_bytes()[:size - 100]) # interrupted append
+
+    pack = IDATpack(pack_filename)
+    assert len(pack) == 1
+
+    pack.append(make_idat_data(seed=1))
+    assert pack_filename.stat().st_size == size
+    assert IDATpack(pack_filename).get(1).per_probe_matrix.equals(make_idat_data(seed=1).per_probe_matrix)
+
+
+def test_pack_corrupt(tmp_path):
+    (tmp_path / "a.idatpack").write_bytes(b"IDATPACX")
+    with pytest.raises(Exception, match="Invalid file format"):
+        IDATpack(tmp_path / "a.idatpack")
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+from idattools.idat import IDATreader, SharedIDATdata
+
+import pickle
+
+import numpy as np
+import pytest
+
+
+
+def check_restored(idat_data, expected):
+    assert idat_data.per_probe_matrix.equals(expected.per_probe_matrix)
+    assert idat_data.get_sentrix_id() == expected.get_sentrix_id()
+
+    idat_data.per_probe_matrix.loc[0, 'probe_mean_intensities'] = 1 # writable
+    assert idat_data.per_probe_matrix['probe_mean_intensities'].iloc[0] == 1
+
+
+@pytest.mark.parametrize("protocol", [4, 5])
+def test_pickle(idat_file, protocol):
+    idat_data = IDATreader(idat_file).data
+
+    check_restored(pickle.loads(pickle.dumps(idat_data, protocol=protocol)), idat_data)
+    assert idat_data.per_probe_matrix['probe_mean_intensities'].iloc[0] != 1 # the original is not changed
+
+
+@pytest.mark.parametrize("as_bytes", [True, False])
+def test_pickle_out_of_band(idat_file, as_bytes):
+    idat_data = IDATreader(idat_file).data
+
+    buffers = []
+    data = pickle.dumps(idat_data, protocol=5, buffer_callback=buffers.append)
+    assert len(buffers) == len(idat_data.per_probe_matrix.columns)
+    assert len(data) < idat_data.per_probe_matrix.memory_usage().sum() # the columns are not in the pickle
+
+    buffers = [bytes(_) if as_bytes else bytearray(_) for _ in buffers]
+    restored = pickle.loads(data, buffers=buffers)
+    if not as_bytes: # writable buffers are viewed, not copied
+        assert np.shares_memory(restored.per_probe_matrix['probe_ids'].to_numpy(), np.frombuffer(buffers[0], dtype='<u4'))
+
+    check_restored(restored, idat_data)
+
+
+def test_shared(idat_file):
+    idat_data = IDATreader(idat_file).data
+
+    shared = idat_data.to_shared()
+    try:
+        data = pickle.dumps(shared)
+        assert len(data) < idat_data.per_probe_matrix.memory_usage().sum() # only the name of the block is pickled
+
+        attached = pickle.loads(data).attach()
+        check_restored(attached, idat_data)
+    finally:
+        shared.release()
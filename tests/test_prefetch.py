@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+from idattools.idat import IDATwriter
+from idattools.prefetch import iter_idats
+
+from conftest import make_idat_data
+
+import asyncio
+
+import pytest
+
+
+
+@pytest.fixture
+def idat_files(tmp_path):
+    idat_files = []
+    for i in range(6):
+        idat_files.append(tmp_path / ("20392745009" + str(i) + "_R01C01_Grn.idat"))
+        IDATwriter(make_idat_data(seed=i, barcode="20392745009" + str(i))).write(idat_files[-1])
+
+    return idat_files
+
+
+async def collect(idat_files, **kwargs):
+    return [data async for data in iter_idats(idat_files, **kwargs)]
+
+
+def test_iter_idats_ordered(idat_files):
+    data = asyncio.run(collect(idat_files, concurrency=2))
+
+    assert [_.array_barcode for _ in data] == ["20392745009" + str(_) for _ in range(6)]
+
+
+def test_iter_idats_unordered(idat_files):
+    data = asyncio.run(collect(idat_files, concurrency=3, ordered=False))
+
+    assert sorted(_.array_barcode for _ in data) == ["20392745009" + str(_) for _ in range(6)]
+
+
+def test_iter_idats_probes(idat_files):
+    data = asyncio.run(collect(idat_files[:2], probes=[1600002]))
+
+    assert [_.array_n_probes for _ in data] == [1, 1]
+
+
+def test_iter_idats_error(idat_files):
+    idat_files[3].write_bytes(b"IDAT")
+
+    with pytest.raises(Exception):
+        asyncio.run(collect(idat_files))
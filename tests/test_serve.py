@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+from idattools.idat import IDATwriter
+from idattools.serve import IDATcache, IDATclient, IDATserver
+
+from conftest import make_idat_data
+
+import threading
+
+import numpy as np
+import pytest
+
+
+
+@pytest.fixture
+def server(tmp_path):
+    idat_filenames = []
+    for i in range(3):
+        idat_filenames.append(tmp_path / ("20392745009" + str(i) + "_R01C01_Grn.idat"))
+        IDATwriter(make_idat_data(seed=i, barcode="20392745009" + str(i))).write(idat_filenames[-1])
+
+    server = IDATserver(tmp_path / "idat.sock", IDATcache(idat_filenames, cache_size=2))
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    thread.join()
+
+
+def test_serve(server):
+    samples = ["203927450090_R01C01_Grn", "203927450092_R01C01_Grn"]
+    expected = [make_idat_data(seed=_).per_probe_matrix for _ in [0, 2]]
+
+    with IDATclient(server.socket_filename) as client:
+        assert client.get_samples() == ["203927450090_R01C01_Grn", "203927450091_R01C01_Grn", "203927450092_R01C01_Grn"]
+
+        values, found = client.get_values(samples)
+        assert found.all()
+        assert np.array_equal(values, np.array([_['probe_mean_intensities'].to_numpy() for _ in expected]))
+
+        probe_ids = np.array([1, expected[0]['probe_ids'].iloc[10]], dtype='<u4') # 1 is not on the array
+        values, found = client.get_values(samples, probe_ids, column='probe_n_beads')
+        assert found.tolist() == [[False, True], [False, True]]
+        assert values[:, 1].tolist() == [_['probe_n_beads'].iloc[10] for _ in expected]
+
+        assert np.array_equal(client.get_probe_ids(samples[0]), expected[0]['probe_ids'].to_numpy())
+        assert client.get_metadata(samples[1])['array_barcode'] == "203927450092"
+
+        with pytest.raises(Exception, match="Unknown sample"):
+            client.get_metadata("unknown")
+
+        stats = client.get_stats()
+        assert stats['cached'] == 2 and stats['misses'] == 2 and stats['hits'] > 0
+        assert stats['latency']['values']['n'] == 2
+
+
+def test_serve_lru(server):
+    with IDATclient(server.socket_filename) as client:
+        for sample in ["203927450090_R01C01_Grn", "203927450091_R01C01_Grn", "203927450092_R01C01_Grn", "203927450090_R01C01_Grn"]:
+            client.get_probe_ids(sample)
+
+        stats = client.get_stats()
+        assert (stats['cached'], stats['hits'], stats['misses']) == (2, 0, 4) # the first sample was evicted
+
+
+def test_serve_stale_socket(tmp_path):
+    (tmp_path / "idat.sock").write_text("")
+
+    with pytest.raises(Exception, match="Not a socket"):
+        IDATserver(tmp_path / "idat.sock", IDATcache([]))
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+
+from idattools.idat import IDATwriter
+from idattools.normalize import IDATnormalizer, read_reference, write_reference
+from idattools.shard import IDATmerger, get_shard, get_shard_header
+
+from conftest import make_idat_data
+
+import io
+
+
+
+def test_sharded_normalize(tmp_path):
+    idat_files = []
+    for seed in range(5):
+        idat_files.append(tmp_path / ("20392745009" + str(seed) + "_R01C01_Grn.idat"))
+        IDATwriter(make_idat_data(seed=seed)).write(idat_files[-1])
+
+    IDATnormalizer(idat_files).normalize(tmp_path / "full")
+
+    n_shards = 6 # more shards than files, one shard is empty
+    partials = []
+    for i in range(n_shards):
+        partials.append(tmp_path / ("reference." + str(i) + ".tsv"))
+        with open(partials[-1], "w") as fh_out:
+            fh_out.write(get_shard_header('normalize-reference', i, n_shards))
+            write_reference(fh_out, *IDATnormalizer(get_shard(idat_files, i, n_shards)).build_partial_reference())
+
+    reference = io.StringIO()
+    IDATmerger(partials[::-1]).merge(reference)
+    reference.seek(0)
+
+    for i in range(2):
+        n = IDATnormalizer(get_shard(idat_files, i, 2))
+        n.set_reference(*read_reference(reference))
+        n.normalize(tmp_path / "sharded")
+        reference.seek(0)
+
+    for idat_file in idat_files:
+        assert (tmp_path / "sharded" / idat_file.name).read_bytes() == (tmp_path / "full" / idat_file.name).read_bytes()
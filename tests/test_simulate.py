@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+from idattools.idat import IDATreader
+from idattools.simulate import IDATsimulator
+
+from conftest import make_idat_data
+
+import numpy as np
+import pytest
+
+
+
+def read_replicates(output_files):
+    return [IDATreader(_).data.per_probe_matrix for _ in output_files]
+
+
+def test_simulate(tmp_path):
+    idat_data = make_idat_data()
+    output_files = IDATsimulator(idat_data, seed=1).simulate(5, tmp_path, chunk_size=2, name_template="{sentrix_id}_rep{i}_Grn.idat.gz")
+
+    assert [_.name for _ in output_files] == ["203927450093_R01C01_rep" + str(_) + "_Grn.idat.gz" for _ in range(1, 6)]
+
+    per_probe_matrix = idat_data.per_probe_matrix
+    replicates = read_replicates(output_files)
+    for replicate in replicates:
+        for column in ['probe_ids', 'probe_std_devs', 'probe_n_beads', 'probe_mid_block']:
+            assert np.array_equal(replicate[column].to_numpy(), per_probe_matrix[column].to_numpy())
+
+        # probes without beads are kept as is
+        no_beads = per_probe_matrix['probe_n_beads'].to_numpy() == 0
+        assert np.array_equal(replicate['probe_mean_intensities'].to_numpy()[no_beads], per_probe_matrix['probe_mean_intensities'].to_numpy()[no_beads])
+
+    assert not np.array_equal(replicates[0]['probe_mean_intensities'].to_numpy(), replicates[1]['probe_mean_intensities'].to_numpy())
+
+
+def test_simulate_deterministic(tmp_path):
+    idat_data = make_idat_data()
+    serial = read_replicates(IDATsimulator(idat_data, seed=7).simulate(4, tmp_path / "serial", chunk_size=3))
+    parallel = read_replicates(IDATsimulator(idat_data, seed=7).simulate(4, tmp_path / "parallel", threads=2, chunk_size=1))
+
+    for a, b in zip(serial, parallel):
+        assert a.equals(b)
+
+
+def test_simulate_bead_fraction(tmp_path):
+    idat_data = make_idat_data()
+    replicate = read_replicates(IDATsimulator(idat_data, seed=1, bead_fraction=0.5).simulate(1, tmp_path))[0]
+
+    assert (replicate['probe_n_beads'].to_numpy() <= idat_data.per_probe_matrix['probe_n_beads'].to_numpy()).all()
+    assert replicate['probe_n_beads'].sum() < idat_data.per_probe_matrix['probe_n_beads'].sum()
+
+    with pytest.raises(Exception, match="Invalid bead fraction"):
+        IDATsimulator(idat_data, bead_fraction=0.0)
+
+
+def test_simulate_template_without_index(tmp_path):
+    with pytest.raises(Exception, match="Name template without"):
+        IDATsimulator(make_idat_data()).simulate(2, tmp_path, name_template="{sentrix_id}.idat")
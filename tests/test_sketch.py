@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+
+from idattools.idat import IDATwriter
+from idattools.qc import IDATqc
+from idattools.sketch import IDATsketches
+
+from conftest import make_idat_data
+
+import numpy as np
+
+
+
+def test_sketches(tmp_path):
+    idat_files = []
+    for seed in range(3):
+        idat_files.append(tmp_path / ("20392745009" + str(seed) + "_R01C01_Grn.idat"))
+        IDATwriter(make_idat_data(seed=seed)).write(idat_files[-1])
+
+    corrupt_file = tmp_path / "203927450099_R01C01_Grn.idat"
+    corrupt_file.write_bytes(idat_files[0].read_bytes()[:3000])
+
+    sketches = IDATsketches(tmp_path / "sketches.npz")
+    assert sketches.update(idat_files + [corrupt_file]) == 3
+    assert list(sketches.names) == [str(_) for _ in idat_files]
+
+    # the last bin of the ratios is open-ended, its quantiles are bounded by the largest ratio
+    assert np.all(np.isfinite(sketches.get_cv_quantile(1.0)))
+    assert np.array_equal(sketches.get_cv_quantile(1.0), sketches.cv_max)
+
+    # built while parsing for qc
+    qc = IDATqc(idat_files, sketch=True)
+    list(qc)
+    sketches_qc = IDATsketches(tmp_path / "sketches_qc.npz")
+    sketches_qc.add(qc.sketches)
+    for field in ['names', 'keys', 'intensity_quantiles', 'n_beads_hist', 'cv_hist', 'cv_max']:
+        assert np.array_equal(getattr(sketches_qc, field), getattr(sketches, field))
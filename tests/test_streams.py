@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+from idattools.idat import IDATreader, IDATwriter
+
+from pathlib import Path
+import io
+import os
+import subprocess
+import sys
+
+import pandas as pd
+
+
+
+idat_tools = [sys.executable, str(Path(__file__).parent.parent / "bin" / "idat-tools")]
+env = dict(os.environ, PYTHONPATH=str(Path(__file__).parent.parent))
+
+
+class ForwardOnly(io.RawIOBase):
+    """Non-seekable stream, like a pipe."""
+
+    def __init__(self, data: bytes):
+        self.fh = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self.fh.readinto(buffer)
+
+
+def test_read_buffers_and_streams(idat_file):
+    expected = IDATreader(idat_file).data.per_probe_matrix
+    data = idat_file.read_bytes()
+
+    for source in [data, bytearray(data), memoryview(data), io.BytesIO(data), io.BufferedReader(ForwardOnly(data))]:
+        pd.testing.assert_frame_equal(IDATreader(source).data.per_probe_matrix, expected)
+
+
+def test_write_file_like(idat_file):
+    fh_out = io.BytesIO()
+    IDATwriter(IDATreader(idat_file).data).write(fh_out)
+
+    assert fh_out.getvalue() == idat_file.read_bytes()
+
+
+def test_cli_stdin_stdout(idat_file):
+    data = idat_file.read_bytes()
+
+    view = subprocess.run(idat_tools + ["view", "-n", "2", "-"], input=data, capture_output=True, env=env, check=True)
+    assert b"[1000 rows x 5 columns]" in view.stdout
+
+    probe_id = str(IDATreader(idat_file).data.per_probe_matrix['probe_ids'].iloc[5])
+    subset = subprocess.run(idat_tools + ["subset", "-p", probe_id, "-", "-"], input=data, capture_output=True, env=env, check=True)
+    assert IDATreader(subset.stdout).data.per_probe_matrix['probe_ids'].tolist() == [int(probe_id)]
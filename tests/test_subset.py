@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+
+from idattools.fsck import check_idat
+from idattools.idat import IDATreader, IDATwriter
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+
+def test_subset(idat_file, tmp_path):
+    per_probe_matrix = IDATreader(idat_file).data.per_probe_matrix
+    probes = per_probe_matrix['probe_ids'].to_numpy()[[500, 3, 999, 0]].tolist() + [1] # 1 is not on the array
+
+    idat_r = IDATreader(idat_file, probes=probes)
+    expected = per_probe_matrix.iloc[[0, 3, 500, 999]].reset_index(drop=True)
+
+    assert idat_r.data.array_n_probes == 4
+    pd.testing.assert_frame_equal(idat_r.data.per_probe_matrix.reset_index(drop=True), expected)
+
+    IDATwriter(idat_r.data).write(tmp_path / "subset.idat")
+    assert check_idat(tmp_path / "subset.idat", deep=True) == []
+    pd.testing.assert_frame_equal(IDATreader(tmp_path / "subset.idat").data.per_probe_matrix, expected)
+
+
+def test_subset_buffer(idat_file):
+    probes = IDATreader(idat_file).data.per_probe_matrix['probe_ids'].to_numpy()[10:20]
+
+    idat_r = IDATreader(idat_file.read_bytes(), probes=probes)
+    assert np.array_equal(idat_r.data.per_probe_matrix['probe_ids'].to_numpy(), probes)
+
+
+def test_subset_no_probes_present(idat_file):
+    with pytest.raises(Exception, match="None of the requested probes"):
+        IDATreader(idat_file, probes=[1, 2, 3])
@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+
+from idattools.idat import IDATreader
+
+
+
+def test_head_tail(idat_file):
+    for n in [1, 2, 3, 10]:
+        idat_r = IDATreader(idat_file, head_tail=n)
+        lines = idat_r.get_head_tail_str().split("\n")
+
+        assert len(idat_r.per_probe_matrix) == n
+        assert len(lines) == 1 + n + 1 + 2 # header, rows, dots, shape
+        assert set(lines[1 + (n + 1) // 2].split()[1:]) == {"..."}
+        assert lines[-1] == "[1000 rows x 5 columns]"
+
+
+def test_head_tail_entire_array(idat_file):
+    idat_r = IDATreader(idat_file, head_tail=2000)
+
+    assert "..." not in idat_r.get_head_tail_str()
+    assert len(idat_r.per_probe_matrix) == 1000
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+from idattools.idat import IDATreader, IDATwriter
+import idattools.idat
+
+import numpy as np
+import pytest
+
+
+
+@pytest.mark.parametrize("load_per_probe_matrix", [True, False])
+def test_write_roundtrip(idat_file, tmp_path, load_per_probe_matrix):
+    idat_r = IDATreader(idat_file, load_per_probe_matrix=load_per_probe_matrix)
+    IDATwriter(idat_r.data).write(tmp_path / "copy.idat")
+
+    assert (tmp_path / "copy.idat").read_bytes() == idat_file.read_bytes()
+
+
+@pytest.mark.parametrize("load_per_probe_matrix", [True, False])
+def test_write_to_source(idat_file, load_per_probe_matrix):
+    original = idat_file.read_bytes()
+
+    idat_r = IDATreader(idat_file, load_per_probe_matrix=load_per_probe_matrix)
+    IDATwriter(idat_r.data).write(idat_file)
+
+    assert idat_file.read_bytes() == original
+    assert not idat_file.with_name(idat_file.name + ".tmp").exists()
+
+
+def test_write_in_place_edit(idat_file, tmp_path):
+    idat_r = IDATreader(idat_file)
+    intensities = idat_r.data.per_probe_matrix['probe_mean_intensities'].to_numpy() // 2
+    idat_r.data.per_probe_matrix['probe_mean_intensities'] = intensities # no set_modified()
+
+    IDATwriter(idat_r.data).write(tmp_path / "edited.idat")
+
+    assert np.array_equal(IDATreader(tmp_path / "edited.idat").data.per_probe_matrix['probe_mean_intensities'].to_numpy(), intensities)
+
+
+def get_copied_sections(monkeypatch, idat_r):
+    ranges = {v: k for k, v in idat_r.get_section_ranges().items()}
+    copied = []
+    copy_range_original = idattools.idat.copy_range
+
+    def copy_range(src_filename, fh_out, offset, size):
+        copied.append(ranges[(offset, size)])
+        return copy_range_original(src_filename, fh_out, offset, size)
+
+    monkeypatch.setattr(idattools.idat, "copy_range", copy_range)
+
+    return copied
+
+
+def test_write_passthrough(idat_file, tmp_path, monkeypatch):
+    idat_r = IDATreader(idat_file)
+    copied = get_copied_sections(monkeypatch, idat_r)
+
+    per_probe_matrix = idat_r.data.per_probe_matrix.copy()
+    per_probe_matrix['probe_std_devs'] = per_probe_matrix['probe_std_devs'].to_numpy() // 2
+    idat_r.data.set_per_probe_matrix(per_probe_matrix)
+    idat_r.data.set_array_sample_id("edited")
+
+    IDATwriter(idat_r.data).write(tmp_path / "edited.idat")
+
+    assert sorted(copied) == sorted(_ for _ in idat_r.data.section_physical_order if _ not in ['PROBE_STD_DEVS', 'ARRAY_SAMPLE_ID'])
+
+    idat_e = IDATreader(tmp_path / "edited.idat")
+    assert idat_e.data.per_probe_matrix.equals(per_probe_matrix)
+    assert idat_e.data.array_sample_id == "edited"
+
+    original, edited = idat_file.read_bytes(), (tmp_path / "edited.idat").read_bytes()
+    original_ranges, edited_ranges = idat_r.get_section_ranges(), idat_e.get_section_ranges()
+    for section in copied:
+        (offset_o, size_o), (offset_e, size_e) = original_ranges[section], edited_ranges[section]
+        assert original[offset_o:offset_o + size_o] == edited[offset_e:offset_e + size_e]
+
+
+def test_write_passthrough_bypassing_setters(idat_file, tmp_path, monkeypatch):
+    idat_r = IDATreader(idat_file)
+    copied = get_copied_sections(monkeypatch, idat_r)
+
+    idat_r.data.per_probe_matrix.loc[0, 'probe_n_beads'] = 99
+    idat_r.data.array_unknown_1 = (2, 0, 0, 0)
+
+    IDATwriter(idat_r.data).write(tmp_path / "edited.idat")
+
+    assert 'PROBE_N_BEADS' not in copied and 'ARRAY_UNKNOWN_1' not in copied and 'PROBE_IDS' in copied
+
+    idat_e = IDATreader(tmp_path / "edited.idat")
+    assert idat_e.data.per_probe_matrix['probe_n_beads'].iloc[0] == 99
+    assert idat_e.data.array_unknown_1 == (2, 0, 0, 0)